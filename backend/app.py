@@ -1,16 +1,25 @@
 # Main Flask application.
 
 # Importing the required libraries.
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
-from PIL import Image
-import io, base64
-from remove_bg import remove_background
-from clip_model import extract_visual_signals
-from color_extractor import extract_colors
-from derive import derive_metadata
-from validation import validate_metadata, generate_validation_report
-from database import init_db, insert_garment, get_all_garments
+import json
+from datetime import datetime, timezone
+from jobs import submit_upload_job, get_job
+from pipeline import analyze_uploads, store_upload
+from validation import generate_validation_report
+from database import (init_db, get_garments, get_garments_page, get_wardrobe_summary, get_wardrobe_stats, get_garment_image, get_garment_image_info,
+                      get_garment_rendition, save_garment_rendition, garment_image_urls, attach_image_urls)
+from recommendation_cache import recommend_from_cache
+from planner import plan_outfits, PLAN_MAX_DAYS
+from thumbnails import pick_rendition_size, make_rendition, RENDITION_MIME_TYPE, WARDROBE_THUMBNAIL_SIZE, OUTFIT_THUMBNAIL_SIZE
+
+# Seconds browsers may cache garment images, URLs change with the content.
+IMAGE_CACHE_MAX_AGE = 31536000
+
+# Default and largest page sizes for /wardrobe.
+WARDROBE_PAGE_SIZE = 50
+WARDROBE_MAX_PAGE_SIZE = 200
 
 # Calling the frontend files to access the Flask application.
 app = Flask(__name__, template_folder="../frontend/templates", static_folder="../frontend/static")
@@ -23,152 +32,105 @@ def index():
     return render_template("index.html")
 
 # The main process begins by uploading an image.
+# Work is queued and the job id is returned right away.
 @app.route("/upload", methods=["POST"])
 def upload_images():
     files = request.files.getlist("images")
-    results = []
-    errors = []
 
-    for idx, file in enumerate(files):
-        try:
-            raw = file.read()
-            image = Image.open(io.BytesIO(raw)).convert("RGB")
-
-            # Removing background
-            bg_removed_bytes = remove_background(raw)
-            image_no_bg = Image.open(bg_removed_bytes).convert("RGBA")
-            
-            # Extracting visual signals
-            clip_signals = extract_visual_signals(image)
-            
-            # Extracting color
-            color_data = extract_colors(image_no_bg)
-            
-            # Getting the metadata
-            metadata = derive_metadata(clip_signals, color_data)
-            
-            # Validating the metadata
-            validation_result = validate_metadata(metadata)
-            validated_meta = validation_result["validated_metadata"]
-            
-            # Adding validation info to debug metadata.
-            validated_meta["debug_metadata"]["validation_flags"] = validation_result["validation_flags"]
-            validated_meta["debug_metadata"]["confidence_adjustment"] = validation_result["confidence_adjustment"]
-            
-            # Log validation issues
-            if validation_result["validation_flags"]:
-                print(f"[{idx+1}] Validation flags:")
-                for flag in validation_result["validation_flags"]:
-                    print(f"  - {flag}")
-            
-            # Converting image to base64 for storage.
-            encoded_image = base64.b64encode(bg_removed_bytes.getvalue()).decode()
-            validated_meta["image_data"] = encoded_image
-            
-            # Storing the data
-            garment_id = insert_garment(validated_meta)
-            
-            if garment_id:
-                print(f"[{idx+1}] Saved as ID {garment_id}: {validated_meta['primary_category']} "
-                      f"({validated_meta['confidence_band']} confidence)")
-                results.append({"image": f"data:image/png;base64,{encoded_image}", "metadata": validated_meta, "validation_report": generate_validation_report(validated_meta)})
+    if not files:
+        return jsonify({"error": "No images uploaded"}), 400
+
+    job_id = submit_upload_job([file.read() for file in files])
+    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+# Streaming variant of upload, one NDJSON line per image as soon as it is stored.
+@app.route("/upload/stream", methods=["POST"])
+def upload_images_stream():
+    raws = [file.read() for file in request.files.getlist("images")]
+
+    def generate():
+        stored = 0
+        for idx, metadata, bg_removed_bytes, error in analyze_uploads(raws):
+            result = None
+            if not error:
+                result = store_upload(idx, metadata, bg_removed_bytes)
+                if not result:
+                    error = f"Failed to save garment {idx + 1}"
+
+            if error:
+                yield json.dumps({"index": idx, "error": error}) + "\n"
             else:
-                errors.append(f"Failed to save garment {idx + 1}")
-        
-        # Error message
-        except Exception as e:
-            print(f"Error processing image {idx + 1}")
-            import traceback
-            traceback.print_exc()
-            errors.append(f"Error processing image {idx + 1}")
-
-    response = {"results": results}
-    if errors:
-        response["errors"] = errors
-    
-    return jsonify(response)
+                stored += 1
+                yield json.dumps({"index": idx, "result": result}) + "\n"
+
+        yield json.dumps({"done": True, "total": len(raws), "stored": stored}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# Function to poll an upload job.
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_upload_job(job_id):
+    job = get_job(job_id)
+
+    # Error message.
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job)
 
 # Function to get the garments.
+# Optional: limit/cursor for paging, fields= projection and filters.
 @app.route("/wardrobe", methods=["GET"])
 def get_wardrobe():
-    # Getting all the garments.
-    garments = get_all_garments()
-    # Setting the confidence level.
-    summary = {
-        "total": len(garments),
-        "by_category": {},
-        "by_confidence": {"High": 0, "Medium": 0, "Low": 0},
-        "needs_review": 0,
+    args = request.args
+    filters = {
+        "categories": args.get("category").split(",") if args.get("category") else None,
+        "formality": args.get("formality"),
+        "color_family": args.get("color_family"),
+        "confidence_band": args.get("confidence_band"),
+        "min_insulation": args.get("min_insulation", type=float),
+        "max_insulation": args.get("max_insulation", type=float),
     }
-    
-    for g in garments:
-        # Counting by category
-        cat = g.get("primary_category", "Unknown")
-        summary["by_category"][cat] = summary["by_category"].get(cat, 0) + 1
-        
-        # Counting by confidence
-        band = g.get("confidence_band", "Low")
-        if band in summary["by_confidence"]:
-            summary["by_confidence"][band] += 1
-        
-        # Counting review flags
-        if g.get("needs_review"):
-            summary["needs_review"] += 1
-    
-    return jsonify({
-        "garments": garments,
-        "summary": summary
-    })
+    limit = args.get("limit", type=int)
+    cursor = args.get("cursor")
+    next_cursor = None
+
+    # Getting the garments, one page when asked.
+    if limit or cursor:
+        limit = max(1, min(limit or WARDROBE_PAGE_SIZE, WARDROBE_MAX_PAGE_SIZE))
+        try:
+            garments, next_cursor = get_garments_page(limit, cursor=cursor, **filters)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    else:
+        garments = get_garments(**filters)
+
+    attach_image_urls(garments, thumbnail_size=WARDROBE_THUMBNAIL_SIZE)
+
+    # Keeping only the requested fields.
+    if args.get("fields"):
+        fields = {"db_id", *args.get("fields").split(",")}
+        garments = [{k: v for k, v in g.items() if k in fields} for g in garments]
+
+    response = {"garments": garments, "next_cursor": next_cursor}
+
+    # Summary on the first page only.
+    if not cursor:
+        response["summary"] = get_wardrobe_summary()
+
+    return jsonify(response)
 
 
 # Function to get the full stats.
 @app.route("/stats", methods=["GET"])
 def get_stats():
-    # Calling all the garments.
-    garments = get_all_garments()
+    # Reading the maintained aggregates.
+    stats = get_wardrobe_stats()
     
     # Error message.
-    if not garments:
+    if not stats["total_items"]:
         return jsonify({"error": "No garments in wardrobe"})
     
-    # Final stats.
-    stats = {
-        "total_items": len(garments),
-        "by_category": {},
-        "by_formality": {},
-        "by_seasonality": {},
-        "by_confidence_band": {},
-        "avg_confidence": 0.0,
-        "needs_review_count": 0,
-    }
-    
-    total_confidence = 0.0
-    
-    for g in garments:
-        # Categorization
-        cat = g.get("primary_category", "Unknown")
-        stats["by_category"][cat] = stats["by_category"].get(cat, 0) + 1
-        
-        # Formality
-        form = g.get("formality_level", "Casual")
-        stats["by_formality"][form] = stats["by_formality"].get(form, 0) + 1
-        
-        # Seasonality
-        seasons = g.get("seasonality", [])
-        for season in seasons:
-            stats["by_seasonality"][season] = stats["by_seasonality"].get(season, 0) + 1
-        
-        # Confidence levels
-        band = g.get("confidence_band", "Low")
-        stats["by_confidence_band"][band] = stats["by_confidence_band"].get(band, 0) + 1
-        
-        total_confidence += g.get("confidence_score", 0.0)
-        
-        if g.get("needs_review"):
-            stats["needs_review_count"] += 1
-    
-    stats["avg_confidence"] = round(total_confidence / len(garments), 2)
-    
     return jsonify(stats)
 
 
@@ -187,8 +149,13 @@ def validate_garment(garment_id):
     report = generate_validation_report(garment)
     return jsonify(report)
 
+# Thumbnail URLs of every garment in some outfits, looked up with one query.
+def _outfit_image_urls(outfits):
+    ids = [g.get("db_id") for o in outfits for g in (o["top"], o["bottom"], o["outerwear"]) if g]
+    return garment_image_urls(ids, size=OUTFIT_THUMBNAIL_SIZE)
+
 # Formatting the data stats.
-def _format_garment(garment):
+def _format_garment(garment, image_urls):
     if not garment:
         return None
     return {
@@ -200,39 +167,123 @@ def _format_garment(garment):
         "type": garment.get("type"),
         "formality_level": garment.get("formality_level"),
         "seasonality": garment.get("seasonality", []),
-        "image": f"data:image/png;base64,{garment.get('image_data')}" if garment.get("image_data") else None
+        "image": image_urls.get(garment.get("db_id"))
     }
 
+# Serving a garment image with content-hash ETags and long-lived caching.
+# ?size= picks the smallest WebP rendition at least that big.
+@app.route("/garments/<int:garment_id>/image", methods=["GET"])
+def get_garment_image_endpoint(garment_id):
+    info = get_garment_image_info(garment_id)
+
+    # Error message.
+    if not info:
+        return jsonify({"error": "Image not found"}), 404
+
+    requested_size = request.args.get("size", type=int)
+    size = pick_rendition_size(requested_size) if requested_size else None
+    image_bytes = None
+    mime_type, etag = info["mime_type"], info["etag"]
+
+    if size:
+        image_bytes, mime_type, etag = get_garment_rendition(garment_id, size)
+
+        # Generating renditions missing for older uploads, served even if saving them fails
+        if not image_bytes:
+            original, _ = get_garment_image(garment_id)
+            image_bytes = make_rendition(original, size)
+            etag = save_garment_rendition(garment_id, size, image_bytes)
+            mime_type = RENDITION_MIME_TYPE
+
+    response = Response(mimetype=mime_type)
+    response.set_etag(etag)
+    response.last_modified = datetime.strptime(info["created_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    response.headers["Cache-Control"] = f"public, max-age={IMAGE_CACHE_MAX_AGE}, immutable"
+
+    # Skipping the blob read when the client already has it
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+
+    if image_bytes is None:
+        image_bytes, _ = get_garment_image(garment_id)
+    response.set_data(image_bytes)
+    return response.make_conditional(request)
+
 # Function to get the outfit recommendations.
 @app.route("/recommend", methods=["POST"])
 def get_outfit_recommendation():
-    # Calling the bext outfit from another file based on it's safety.
-    from outfit_safety import select_best_outfit_separate
-
     data = request.get_json()
     temp = data.get("temperature", 20)
     weather = data.get("weather", "sunny")
     formality = data.get("event_formality", "casual")
+    seed = data.get("seed")
 
-    # Geting garments
-    all_garments = get_all_garments()
-    tops = [g for g in all_garments if g["primary_category"] == "Top"]
-    bottoms = [g for g in all_garments if g["primary_category"] == "Bottom"]
-    outerwear = [g for g in all_garments if g["primary_category"] == "Outerwear"]
+    # Error message.
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        return jsonify({"error": "seed must be a non-negative whole number."}), 400
 
-    # Selecting outfit with independent randomization
-    outfit = select_best_outfit_separate(tops, bottoms, outerwear, temp, formality, weather)
+    # Picking from the cached candidate pool for these conditions
+    outfit = recommend_from_cache(temp, weather, formality, seed=seed)
 
     # Error message.
     if not outfit:
         return jsonify({"error": "No suitable outfit found."}), 400
 
+    image_urls = _outfit_image_urls([outfit])
     return jsonify({
-        "outfit": {"top": _format_garment(outfit["top"]), "bottom": _format_garment(outfit["bottom"]), "outerwear": _format_garment(outfit["outerwear"]) if outfit["outerwear"] else None },
+        "outfit": {"top": _format_garment(outfit["top"], image_urls), "bottom": _format_garment(outfit["bottom"], image_urls), "outerwear": _format_garment(outfit["outerwear"], image_urls) if outfit["outerwear"] else None },
         "score": outfit["score"],
         "reasoning": outfit["reasoning"]
     })
 
+# Planning outfits for a multi-day forecast.
+# Body: {"days": [{"temperature", "weather", "event_formality"}, ...], "no_repeat_days": N}
+@app.route("/plan", methods=["POST"])
+def plan_outfit_week():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    days = data.get("days") or []
+    repeat_window = data.get("no_repeat_days")
+
+    # Error messages.
+    if not isinstance(days, list):
+        return jsonify({"error": "days must be a list."}), 400
+    if not days:
+        return jsonify({"error": "No days to plan."}), 400
+    if len(days) > PLAN_MAX_DAYS:
+        return jsonify({"error": f"Can plan at most {PLAN_MAX_DAYS} days."}), 400
+    for number, day in enumerate(days, start=1):
+        if not isinstance(day, dict):
+            return jsonify({"error": f"Day {number} must be an object."}), 400
+        temperature = day.get("temperature", 20)
+        if isinstance(temperature, bool) or not isinstance(temperature, (int, float)):
+            return jsonify({"error": f"Day {number} temperature must be a number."}), 400
+        if not isinstance(day.get("weather", "sunny"), str) or not isinstance(day.get("event_formality", "casual"), str):
+            return jsonify({"error": f"Day {number} weather and event_formality must be text."}), 400
+    if repeat_window is not None and (isinstance(repeat_window, bool) or not isinstance(repeat_window, int)):
+        return jsonify({"error": "no_repeat_days must be a whole number."}), 400
+
+    plan = plan_outfits(days, repeat_window=repeat_window)
+
+    image_urls = _outfit_image_urls([planned["outfit"] for planned in plan if planned["outfit"]])
+    results = []
+    for day, planned in zip(days, plan):
+        outfit = planned["outfit"]
+        if not outfit:
+            results.append({"day": day, "error": "No suitable outfit found."})
+            continue
+        results.append({
+            "day": day,
+            "outfit": {"top": _format_garment(outfit["top"], image_urls), "bottom": _format_garment(outfit["bottom"], image_urls), "outerwear": _format_garment(outfit["outerwear"], image_urls) if outfit["outerwear"] else None},
+            "score": outfit["score"],
+            "reasoning": outfit["reasoning"],
+            "repeats_garment": planned["repeats"]
+        })
+
+    return jsonify({"days": results})
+
 # Function to generate another outfit.
 @app.route("/recommend/alternatives", methods=["POST"])
 def get_outfit_alternatives():
@@ -0,0 +1,61 @@
+# Benchmark for the dominant color engines.
+# Usage: python bench_colors.py [image files...]
+# Without files the background-removed images in the wardrobe are used.
+
+# Importing the required libraries.
+import sys, io, time
+import numpy as np
+from PIL import Image
+from color_extractor import extract_colors
+
+# Loading the benchmark images.
+def _load_images(paths):
+    if paths:
+        return [Image.open(p).convert("RGBA") for p in paths]
+
+    from database import get_all_garments, get_garment_image
+    images = []
+    for g in get_all_garments():
+        image_bytes, _ = get_garment_image(g["db_id"])
+        if image_bytes:
+            images.append(Image.open(io.BytesIO(image_bytes)).convert("RGBA"))
+    return images
+
+# Timing one engine over all images.
+def _run(engine, images):
+    # Warm up imports
+    extract_colors(images[0], engine=engine)
+
+    results = []
+    start = time.perf_counter()
+    for image in images:
+        results.append(extract_colors(image, engine=engine))
+    elapsed = time.perf_counter() - start
+
+    return results, elapsed
+
+def main(paths):
+    images = _load_images(paths)
+    if not images:
+        print("No images to benchmark.")
+        return
+
+    kmeans_results, kmeans_time = _run("kmeans", images)
+    hist_results, hist_time = _run("histogram", images)
+
+    # Agreement between engines
+    family_matches = sum(1 for k, h in zip(kmeans_results, hist_results) if k["color_family"] == h["color_family"])
+    rgb_distance = np.mean([
+        np.linalg.norm(np.array(k["primary_rgb"]) - np.array(h["primary_rgb"]))
+        for k, h in zip(kmeans_results, hist_results)
+    ])
+
+    n = len(images)
+    print(f"Images: {n}")
+    print(f"kmeans:    {kmeans_time / n * 1000:.1f} ms/image")
+    print(f"histogram: {hist_time / n * 1000:.1f} ms/image")
+    print(f"Color family agreement: {family_matches}/{n} ({family_matches / n:.0%})")
+    print(f"Mean primary RGB distance: {rgb_distance:.1f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
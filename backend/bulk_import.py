@@ -0,0 +1,119 @@
+# Offline bulk import of garment photos.
+# Usage: python bulk_import.py <folder or .zip> [--workers N] [--batch-size N]
+# Files already imported are skipped, so an interrupted run can be restarted.
+
+# Importing the required libraries.
+import io
+import os
+import sys
+import zipfile
+import argparse
+import multiprocessing
+from database import init_db, insert_garments, get_imported_sources
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".heic")
+
+# Listing image sources as (source_key, path, zip_member).
+def _list_sources(path):
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            names = sorted(n for n in zf.namelist() if n.lower().endswith(IMAGE_EXTENSIONS))
+        zip_key = os.path.abspath(path)
+        return [(f"{zip_key}::{name}", path, name) for name in names]
+
+    sources = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                full = os.path.abspath(os.path.join(root, name))
+                sources.append((full, full, None))
+    return sorted(sources)
+
+# Loading the models once per worker process.
+def _init_worker():
+    global _models
+    from PIL import Image
+    from remove_bg import remove_background
+    from clip_model import extract_visual_signals
+    from color_extractor import extract_colors
+    from pipeline import build_metadata
+    from thumbnails import make_renditions
+    _models = (Image, remove_background, extract_visual_signals, extract_colors, build_metadata, make_renditions)
+
+# Running the full pipeline for one source inside a worker.
+def _analyze_source(args):
+    idx, (source, path, member) = args
+    Image, remove_background, extract_visual_signals, extract_colors, build_metadata, make_renditions = _models
+
+    try:
+        if member is None:
+            with open(path, "rb") as f:
+                raw = f.read()
+        else:
+            with zipfile.ZipFile(path) as zf:
+                raw = zf.read(member)
+
+        image = Image.open(io.BytesIO(raw)).convert("RGB")
+        bg_removed_bytes = remove_background(raw)
+        image_no_bg = Image.open(bg_removed_bytes).convert("RGBA")
+
+        clip_signals = extract_visual_signals(image)
+        color_data = extract_colors(image_no_bg)
+        metadata = build_metadata(idx, clip_signals, color_data)
+        image_bytes = bg_removed_bytes.getvalue()
+        return source, metadata, (image_bytes, make_renditions(image_bytes)), None
+
+    except Exception as e:
+        return source, None, None, str(e)
+
+# Writing one batch of results.
+def _flush(batch):
+    if not batch:
+        return 0
+    ids = insert_garments(
+        [m for _, m, _ in batch],
+        sources=[s for s, _, _ in batch],
+        images=[i[0] for _, _, i in batch],
+        renditions=[i[1] for _, _, i in batch],
+    )
+    return len(ids)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import garment photos from a folder or zip archive.")
+    parser.add_argument("path", help="Folder or .zip archive with garment photos")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Worker processes, each loads its own models")
+    parser.add_argument("--batch-size", type=int, default=25, help="Garments written per database transaction")
+    args = parser.parse_args(argv)
+
+    init_db()
+
+    # Skipping what a previous run already stored
+    done = get_imported_sources()
+    sources = [s for s in _list_sources(args.path) if s[0] not in done]
+    print(f"{len(sources)} images to import ({len(done)} already imported).")
+    if not sources:
+        return
+
+    saved = 0
+    failed = 0
+    batch = []
+    ctx = multiprocessing.get_context("spawn")
+
+    with ctx.Pool(processes=max(1, args.workers), initializer=_init_worker) as pool:
+        for n, (source, metadata, images, error) in enumerate(pool.imap_unordered(_analyze_source, enumerate(sources)), start=1):
+            if error:
+                failed += 1
+                print(f"[{n}/{len(sources)}] Failed {source}: {error}")
+                continue
+
+            print(f"[{n}/{len(sources)}] {metadata['primary_category']} ({metadata['confidence_band']} confidence) from {source}")
+            batch.append((source, metadata, images))
+            if len(batch) >= args.batch_size:
+                saved += _flush(batch)
+                batch = []
+
+    saved += _flush(batch)
+    print(f"Imported {saved} garments, {failed} failed.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,117 +1,204 @@
 # Importing the required libraries.
 import clip
 import torch
+import os
+import hashlib
 from PIL import Image
 
 # OPENAI clip model for basic cpu.
+MODEL_NAME = "ViT-B/32"
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+model, preprocess = clip.load(MODEL_NAME, device=device)
+
+# Folder for the cached text embeddings.
+PROMPT_CACHE_DIR = os.environ.get("CLIP_PROMPT_CACHE_DIR", "clip_cache")
+
+# Fixed text prompts for every label group.
+PROMPT_GROUPS = {
+    # Category.
+    "category": [
+        "upper body clothing shirt jacket sweater top",
+        "lower body clothing pants jeans shorts skirt",
+        "heavy jacket coat outerwear layering piece",
+        "footwear shoes boots sneakers",
+    ],
+
+    # Subtype score
+    "subtype": [
+        "hoodie hooded sweatshirt with hood",
+        "sweatshirt pullover crewneck sweater",
+        "casual t-shirt tee shirt short sleeves",
+        "dress shirt button-up collared shirt long sleeves",
+        "tank top sleeveless shirt",
+    ],
+
+    # Thermal conditions.
+    "weight": [
+        "thin lightweight breathable summer clothing",
+        "medium weight spring fall clothing",
+        "thick heavy insulated winter clothing padded",
+    ],
+
+    # Styling.
+    # A formal peacoat gets specific recognition
+    "formality": [
+        "casual everyday relaxed clothing streetwear hoodie joggers",
+        "smart casual business casual neat clothing blazer chinos",
+        "formal business professional elegant clothing suit dress shirt",
+        "formal coat peacoat trench coat wool overcoat tailored outerwear"
+    ],
+
+    # Sleves length.
+    "sleeve": [
+        "sleeveless no sleeves",
+        "short sleeves",
+        "long sleeves full coverage",
+    ],
+
+    # Weather proof.
+    "weather": [
+        "rain jacket waterproof water resistant",
+        "windbreaker wind resistant shell",
+        "regular fabric not weather resistant",
+    ],
+
+    # CColor combination.
+    "color": [
+        "dark colored black navy charcoal",
+        "light colored white cream beige",
+        "bright vibrant colored",
+        "neutral gray brown tan",
+        "earth tone olive brown rust",
+    ],
+}
+
+# Encoding the text prompts once, reusing the disk cache when possible.
+def _load_prompt_embeddings(labels):
+    key = hashlib.sha256((MODEL_NAME + "\n" + "\n".join(labels)).encode("utf-8")).hexdigest()
+    path = os.path.join(PROMPT_CACHE_DIR, f"{key}.pt")
+
+    if os.path.exists(path):
+        try:
+            return torch.load(path, map_location=device)
+        except Exception as e:
+            print(f"Prompt cache read error: {e}")
+
+    txt = clip.tokenize(labels).to(device)
+    with torch.no_grad():
+        txt_f = model.encode_text(txt)
+        txt_f /= txt_f.norm(dim = -1, keepdim = True)
+
+    try:
+        os.makedirs(PROMPT_CACHE_DIR, exist_ok=True)
+        torch.save(txt_f.cpu(), path)
+    except Exception as e:
+        print(f"Prompt cache write error: {e}")
+
+    return txt_f
+
+# Normalized text embeddings for every label group.
+PROMPT_EMBEDDINGS = {group: _load_prompt_embeddings(labels) for group, labels in PROMPT_GROUPS.items()}
+
+# All groups stacked into one matrix so a single matmul scores everything.
+PROMPT_MATRIX = torch.cat([PROMPT_EMBEDDINGS[group] for group in PROMPT_GROUPS], dim=0).to(device)
+PROMPT_SLICES = {}
+_offset = 0
+for _group, _labels in PROMPT_GROUPS.items():
+    PROMPT_SLICES[_group] = (_offset, _offset + len(_labels))
+    _offset += len(_labels)
+
+# Largest number of images pushed through the encoder at once.
+CLIP_BATCH_SIZE = int(os.environ.get("CLIP_BATCH_SIZE", 16))
 
 # Extracting the visual signals.
 def extract_visual_signals(image: Image.Image):
 
     try:
-        # Category.
-        category_scores = _score_image(image, [
-            "upper body clothing shirt jacket sweater top",
-            "lower body clothing pants jeans shorts skirt",
-            "heavy jacket coat outerwear layering piece",
-            "footwear shoes boots sneakers",
-        ])
-
-        # Subtype score
-        subtype_scores = _score_image(image, [
-            "hoodie hooded sweatshirt with hood",
-            "sweatshirt pullover crewneck sweater",
-            "casual t-shirt tee shirt short sleeves",
-            "dress shirt button-up collared shirt long sleeves",
-            "tank top sleeveless shirt",
-        ])
-        
-        # Thermal conditions.
-        weight_scores = _score_image(image, [
-            "thin lightweight breathable summer clothing",
-            "medium weight spring fall clothing",
-            "thick heavy insulated winter clothing padded",
-        ])
-        
-        # Styling.
-        # A formal peacoat gets specific recognition
-        formality_scores = _score_image(image, [
-            "casual everyday relaxed clothing streetwear hoodie joggers",
-            "smart casual business casual neat clothing blazer chinos",
-            "formal business professional elegant clothing suit dress shirt",
-            "formal coat peacoat trench coat wool overcoat tailored outerwear"
-        ])
-        
-        # Sleves length.
-        sleeve_scores = _score_image(image, [
-            "sleeveless no sleeves",
-            "short sleeves",
-            "long sleeves full coverage",
-        ])
-        
-        # Weather proof.
-        weather_scores = _score_image(image, [
-            "rain jacket waterproof water resistant",
-            "windbreaker wind resistant shell",
-            "regular fabric not weather resistant",
-        ])
-        
-        # CColor combination.
-        color_scores = _score_image(image, [
-            "dark colored black navy charcoal",
-            "light colored white cream beige",
-            "bright vibrant colored",
-            "neutral gray brown tan",
-            "earth tone olive brown rust",
-        ])
-        
-        # Confidence
-        confidence = _calculate_detection_confidence(
-            category_scores,
-            weight_scores,
-            formality_scores
-        )
-        
-        return {
-            "category_scores": category_scores,
-            "subtype_scores": subtype_scores,
-            "weight_scores": weight_scores,
-            "formality_scores": formality_scores,
-            "sleeve_scores": sleeve_scores,
-            "weather_scores": weather_scores,
-            "color_scores": color_scores,
-            "detection_confidence": float(confidence),
-        }
+        img_f = _encode_images([image])
+        return _signals_from_scores(_score_embeddings(img_f)[0])
     
     except Exception as e:
         print(f"CLIP extraction error: {e}")
-        # Returning safe defaults
-        return {
-            "category_scores": {},
-            "subtype_scores": {},
-            "weight_scores": {},
-            "formality_scores": {},
-            "sleeve_scores": {},
-            "weather_scores": {},
-            "color_scores": {},
-            "detection_confidence": 0.0,
-        }
-
-# A function to score the right garments based on text labels.
-def _score_image(image, labels):
-    img = preprocess(image).unsqueeze(0).to(device)
-    txt = clip.tokenize(labels).to(device)
+        return _empty_signals()
+
+# Extracting the visual signals for many images with batched encoding.
+def extract_visual_signals_batch(images, batch_size=None):
+    batch_size = max(1, batch_size or CLIP_BATCH_SIZE)
+    signals = []
+
+    for i in range(0, len(images), batch_size):
+        chunk = images[i:i + batch_size]
+        try:
+            img_f = _encode_images(chunk)
+            signals.extend(_signals_from_scores(s) for s in _score_embeddings(img_f))
+        except Exception as e:
+            # Falling back to one image at a time
+            print(f"CLIP batch extraction error: {e}")
+            signals.extend(extract_visual_signals(image) for image in chunk)
+
+    return signals
+
+# Building the signal dict from per-group scores.
+def _signals_from_scores(group_scores):
+    category_scores = group_scores["category"]
+    weight_scores = group_scores["weight"]
+    formality_scores = group_scores["formality"]
+
+    # Confidence
+    confidence = _calculate_detection_confidence(
+        category_scores,
+        weight_scores,
+        formality_scores
+    )
+    
+    return {
+        "category_scores": category_scores,
+        "subtype_scores": group_scores["subtype"],
+        "weight_scores": weight_scores,
+        "formality_scores": formality_scores,
+        "sleeve_scores": group_scores["sleeve"],
+        "weather_scores": group_scores["weather"],
+        "color_scores": group_scores["color"],
+        "detection_confidence": float(confidence),
+    }
+
+# Returning safe defaults
+def _empty_signals():
+    return {
+        "category_scores": {},
+        "subtype_scores": {},
+        "weight_scores": {},
+        "formality_scores": {},
+        "sleeve_scores": {},
+        "weather_scores": {},
+        "color_scores": {},
+        "detection_confidence": 0.0,
+    }
+
+# Encoding a list of images into normalized embeddings.
+def _encode_images(images):
+    img = torch.stack([preprocess(image) for image in images]).to(device)
     
     with torch.no_grad():
         img_f = model.encode_image(img)
-        txt_f = model.encode_text(txt)
         img_f /= img_f.norm(dim = -1, keepdim = True)
-        txt_f /= txt_f.norm(dim = -1, keepdim = True)
-        scores = (img_f @ txt_f.T).squeeze(0)
     
-    return {labels[i]: float(scores[i]) for i in range(len(labels))}
+    return img_f
+
+# Scoring image embeddings against every label group at once.
+def _score_embeddings(img_f):
+    with torch.no_grad():
+        all_scores = (img_f @ PROMPT_MATRIX.T.to(img_f.dtype)).tolist()
+    
+    results = []
+    for scores in all_scores:
+        group_scores = {}
+        for group, labels in PROMPT_GROUPS.items():
+            start, end = PROMPT_SLICES[group]
+            group_scores[group] = {labels[i]: float(s) for i, s in enumerate(scores[start:end])}
+        results.append(group_scores)
+    
+    return results
 
 # Calculating overall detection confidence based on scores.
 def _calculate_detection_confidence(category_scores, weight_scores, formality_scores):
@@ -1,11 +1,28 @@
 # Importing required library.
+import os
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
 from PIL import Image
 
+# Dominant color engine, "kmeans" or "histogram".
+COLOR_ENGINE = os.environ.get("COLOR_ENGINE", "kmeans")
+
+# Bits kept per channel for the histogram engine.
+HISTOGRAM_BITS = 3
+
+# Number of palette colors and the smallest pixel share kept.
+PALETTE_SIZE = 3
+PALETTE_MIN_SHARE = 0.05
+
+# Limits for two palette colors to count as shades of one color.
+# Light and shadow change lightness but keep hue and chroma relative to lightness.
+ACHROMATIC_CHROMA = 8
+SAME_COLOR_HUE = 25
+SAME_COLOR_SATURATION_RATIO = 1.8
+SAME_NEUTRAL_LIGHTNESS = 50
+
 # A function to extract colours.
-def extract_colors(image):
+def extract_colors(image, engine=None):
     img_array = np.array(image)
     
     # Handling transparency
@@ -14,67 +31,132 @@ def extract_colors(image):
         mask = alpha > 128
 
         if mask.sum() < 100:
-            return {"primary_rgb": [128, 128, 128], "color_family": "Neutral"}
+            return {"primary_rgb": [128, 128, 128], "color_family": "Neutral", "palette": []}
         rgb_pixels = img_array[mask][:, :3]
         
     else:
         rgb_pixels = img_array.reshape(-1, 3)
     
     if len(rgb_pixels) < 100:
-        return {"primary_rgb": [128, 128, 128], "color_family": "Neutral"}
+        return {"primary_rgb": [128, 128, 128], "color_family": "Neutral", "palette": []}
     
-    # Performance sample.
+    # Finding the color palette
+    if (engine or COLOR_ENGINE) == "histogram":
+        colors, shares = _palette_histogram(rgb_pixels)
+    else:
+        colors, shares = _palette_kmeans(rgb_pixels)
+    
+    # Mapping every palette color to a family in one pass
+    families = _classify_color_families(colors)
+    primary_color = colors[0]
+    
+    palette = [
+        {"rgb": colors[i].tolist(), "share": round(float(shares[i]), 3), "color_family": families[i]}
+        for i in range(min(PALETTE_SIZE, len(colors)))
+        if shares[i] >= PALETTE_MIN_SHARE or i == 0
+    ]
+    
+    return {"primary_rgb": primary_color.tolist(), "color_family": families[0], "palette": palette, }
+
+# Palette from KMeans clustering on a pixel sample, largest cluster first.
+def _palette_kmeans(rgb_pixels):
+    from sklearn.cluster import KMeans
+
+    # Performance sample with a fixed seed so results repeat.
     if len(rgb_pixels) > 5000:
-        indices = np.random.choice(len(rgb_pixels), 5000, replace = False)
+        indices = np.random.default_rng(42).choice(len(rgb_pixels), 5000, replace = False)
         rgb_pixels = rgb_pixels[indices]
     
-    # Finding dominant color
-    kmeans = KMeans(n_clusters=3, random_state = 42, n_init=5)
+    kmeans = KMeans(n_clusters=PALETTE_SIZE, random_state = 42, n_init=5)
     kmeans.fit(rgb_pixels.astype(np.float32))
     
-    labels = kmeans.labels_
-    counts = np.bincount(labels)
-    dominant_idx = counts.argmax()
-    primary_color = kmeans.cluster_centers_[dominant_idx].astype(int)
+    counts = np.bincount(kmeans.labels_, minlength=PALETTE_SIZE)
+    order = np.argsort(-counts, kind="stable")
+    colors = kmeans.cluster_centers_[order].astype(int)
+    return colors, counts[order] / counts.sum()
+
+# Palette from a quantized 3D color histogram over all pixels, largest bin first.
+def _palette_histogram(rgb_pixels):
+    shift = 8 - HISTOGRAM_BITS
+    pixels = rgb_pixels.astype(np.int64)
+    q = pixels >> shift
+    bins = (q[:, 0] << (2 * HISTOGRAM_BITS)) | (q[:, 1] << HISTOGRAM_BITS) | q[:, 2]
     
-    # Mapping to color family
-    color_family = _classify_color_family(primary_color)
+    n_bins = 1 << (3 * HISTOGRAM_BITS)
+    counts = np.bincount(bins, minlength=n_bins)
+    top_bins = np.argsort(-counts, kind="stable")[:PALETTE_SIZE]
+    top_bins = top_bins[counts[top_bins] > 0]
     
-    return {"primary_rgb": primary_color.tolist(), "color_family": color_family, }
+    # Mean of the pixels inside each winning bin
+    sums = np.stack([np.bincount(bins, weights=pixels[:, c], minlength=n_bins) for c in range(3)], axis=1)
+    colors = (sums[top_bins] / counts[top_bins, None]).astype(int)
+    return colors, counts[top_bins] / len(pixels)
 
-# Mapping RGB to color family.
-def _classify_color_family(rgb):
-    r, g, b = rgb
-    hsv = cv2.cvtColor(np.uint8([[rgb]]), cv2.COLOR_RGB2HSV)[0][0]
-    h, s, v = hsv
-    
-    # Neutral colours
-    if s < 25:
-        if v > 200:
-            # White-ish colurs
-            return "Neutral"
-        elif v < 60:
-            # Black-ish colours
-            return "Dark"
-        else:
-            # Gray colours
-            return "Neutral"
+# Mapping many RGB colors to color families with one HSV conversion.
+def _classify_color_families(rgbs):
+    rgbs = np.clip(np.asarray(rgbs).reshape(-1, 3), 0, 255).astype(np.uint8)
+    hsv = cv2.cvtColor(rgbs.reshape(-1, 1, 3), cv2.COLOR_RGB2HSV).reshape(-1, 3).astype(int)
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
     
-    # Earth tones
-    if s < 80 and (h < 40 or h > 150):
-        return "Earth"
+    # Same rules as before, checked in order.
+    families = np.select(
+        [
+            # Neutral colours, black-ish ones are dark
+            (s < 25) & (v < 60),
+            s < 25,
+            # Earth tones
+            (s < 80) & ((h < 40) | (h > 150)),
+            # Dark colors
+            v < 90,
+            # Light colors
+            (v > 180) & (s < 100),
+            # Bright colors
+            s > 100,
+        ],
+        ["Dark", "Neutral", "Earth", "Dark", "Light", "Bright"],
+        default="Neutral",
+    )
+    return families.tolist()
+
+# Lab lightness, chroma and hue angle for many RGB colors.
+def _lab_lch(rgbs):
+    rgbs = np.clip(np.asarray(rgbs).reshape(-1, 3), 0, 255).astype(np.uint8)
+    lab = cv2.cvtColor(rgbs.reshape(-1, 1, 3), cv2.COLOR_RGB2LAB).reshape(-1, 3).astype(float)
+    lightness = lab[:, 0] * 100 / 255
+    a, b = lab[:, 1] - 128, lab[:, 2] - 128
+    return lightness, np.hypot(a, b), np.degrees(np.arctan2(b, a)) % 360
+
+# Checking if two colors given as (lightness, chroma, hue) are shades of one color.
+def _same_color(first, second):
+    (l1, c1, h1), (l2, c2, h2) = first, second
     
-    # Dark colors
-    if v < 90:
-        return "Dark"
+    # Grays, blacks and whites only differ in lightness, muted colors can shade into them
+    if c1 < ACHROMATIC_CHROMA or c2 < ACHROMATIC_CHROMA:
+        return max(c1, c2) < 2 * ACHROMATIC_CHROMA and abs(l1 - l2) < SAME_NEUTRAL_LIGHTNESS
     
-    # Light colors
-    if v > 180 and s < 100:
-        return "Light"
+    hue_gap = min(abs(h1 - h2), 360 - abs(h1 - h2))
+    saturation1, saturation2 = c1 / max(l1, 1), c2 / max(l2, 1)
+    ratio = max(saturation1, saturation2) / min(saturation1, saturation2)
+    return hue_gap < SAME_COLOR_HUE and ratio < SAME_COLOR_SATURATION_RATIO
+
+# Merging palette shades into distinct colors, largest first.
+# Each color keeps the family of its largest shade and the summed share.
+def distinct_palette_colors(palette):
+    palette = [c for c in palette or [] if c.get("rgb")]
+    if not palette:
+        return []
     
-    # Bright colors
-    if s > 100:
-        return "Bright"
+    lightness, chroma, hue = _lab_lch([c["rgb"] for c in palette])
+    groups = []
+    for i in np.argsort([-c.get("share", 0) for c in palette], kind="stable"):
+        color = (lightness[i], chroma[i], hue[i])
+        for group in groups:
+            if any(_same_color(color, shade) for shade in group["shades"]):
+                group["shades"].append(color)
+                group["share"] += palette[i].get("share", 0)
+                break
+        else:
+            groups.append({"shades": [color], "share": palette[i].get("share", 0), "color_family": palette[i].get("color_family")})
     
-    # Default
-    return "Neutral"
\ No newline at end of file
+    groups.sort(key=lambda g: -g["share"])
+    return [{"share": round(g["share"], 3), "color_family": g["color_family"]} for g in groups]
@@ -1,11 +1,56 @@
 # Storage for garment metadata.
 # Importing required libraries.
+import os
 import sqlite3
 import json
+import base64
+import hashlib
+import threading
+import time
+
+# Database file location.
+DB_PATH = os.environ.get("OUTFITS_DB_PATH", "outfits.db")
+
+# Milliseconds to wait on a locked database before failing.
+DB_BUSY_TIMEOUT = int(os.environ.get("OUTFITS_DB_BUSY_TIMEOUT", 5000))
+
+# Ids bound per IN (...) query, below SQLite's default limit of 999 parameters.
+SQL_PARAM_CHUNK = 900
+
+# Garment fields copied into their own indexed columns.
+PROMOTED_COLUMNS = {
+    "primary_category": "TEXT",
+    "formality_level": "TEXT",
+    "color_family": "TEXT",
+    "color_role": "TEXT",
+    "insulation_score": "REAL",
+    "confidence_band": "TEXT",
+    "rain_safe": "TEXT",
+    "needs_review": "INTEGER",
+}
+
+_local = threading.local()
+
+# Getting this thread's connection, opening a tuned one on first use.
+def get_connection():
+    conn = getattr(_local, "conn", None)
+
+    # Forked workers must not reuse the parent's connection
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
 
 # Initializing database with garments table
 def init_db():
-    conn = sqlite3.connect("outfits.db")
+    conn = get_connection()
     c = conn.cursor()
     c.execute("""
         CREATE TABLE IF NOT EXISTS garments (
@@ -14,22 +59,161 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    # Source files already imported by the bulk importer.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS imported_files (
+            source TEXT PRIMARY KEY,
+            garment_id INTEGER NOT NULL
+        )
+    """)
+    # Garment images as raw bytes, kept out of the metadata rows.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS garment_images (
+            garment_id INTEGER PRIMARY KEY REFERENCES garments(id) ON DELETE CASCADE,
+            data BLOB NOT NULL,
+            mime_type TEXT NOT NULL DEFAULT 'image/png',
+            etag TEXT
+        )
+    """)
+    # Smaller WebP renditions of each garment image.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS garment_image_renditions (
+            garment_id INTEGER NOT NULL REFERENCES garments(id) ON DELETE CASCADE,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            mime_type TEXT NOT NULL DEFAULT 'image/webp',
+            etag TEXT NOT NULL,
+            PRIMARY KEY (garment_id, size)
+        )
+    """)
+    # Wardrobe version, bumped on every insert and delete.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS wardrobe_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO wardrobe_meta (key, value) VALUES ('version', 0)")
+    # Running wardrobe aggregates, kept in step with inserts and deletes.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS wardrobe_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (dimension, key)
+        )
+    """)
+    # Upload job progress, shared by every worker process.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            processed INTEGER NOT NULL DEFAULT 0,
+            images TEXT NOT NULL,
+            results TEXT NOT NULL DEFAULT '[]',
+            errors TEXT NOT NULL DEFAULT '[]',
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            owner_pid INTEGER,
+            updated_at REAL
+        )
+    """)
+    _migrate_promoted_columns(c)
+    _migrate_inline_images(c)
+    _migrate_image_etags(c)
+    
+    # Building the aggregates for wardrobes stored before they existed
+    if not c.execute("SELECT 1 FROM wardrobe_stats LIMIT 1").fetchone():
+        _rebuild_stats(c)
     conn.commit()
-    conn.close()
+
+# Moving base64 images out of the metadata JSON into the image table.
+def _migrate_inline_images(c):
+    rows = c.execute("SELECT id, json_extract(data, '$.image_data') FROM garments WHERE json_extract(data, '$.image_data') IS NOT NULL").fetchall()
+    
+    for garment_id, encoded in rows:
+        try:
+            image_bytes = base64.b64decode(encoded)
+            c.execute("INSERT OR REPLACE INTO garment_images (garment_id, data, etag) VALUES (?, ?, ?)", (garment_id, image_bytes, _image_etag(image_bytes)))
+        except (ValueError, TypeError) as e:
+            print(f"Error moving image for garment {garment_id}: {e}")
+        c.execute("UPDATE garments SET data = json_remove(data, '$.image_data') WHERE id = ?", (garment_id,))
+
+# Adding missing promoted columns, backfilling them from the JSON and indexing them.
+def _migrate_promoted_columns(c):
+    existing = {row[1] for row in c.execute("PRAGMA table_info(garments)").fetchall()}
+    
+    added = []
+    for column, column_type in PROMOTED_COLUMNS.items():
+        if column not in existing:
+            c.execute(f"ALTER TABLE garments ADD COLUMN {column} {column_type}")
+            added.append(column)
+    
+    # Backfilling old rows
+    if added:
+        assignments = ", ".join(f"{column} = json_extract(data, '$.{column}')" for column in added)
+        c.execute(f"UPDATE garments SET {assignments}")
+    
+    c.execute("CREATE INDEX IF NOT EXISTS idx_garments_category_insulation ON garments (primary_category, insulation_score)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_garments_formality ON garments (formality_level)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_garments_color_family ON garments (color_family)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_garments_confidence_band ON garments (confidence_band)")
+    c.execute("DROP INDEX IF EXISTS idx_garments_created_at")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_garments_created_at_id ON garments (created_at, id)")
+
+# Adding content hashes to images stored before they had one.
+def _migrate_image_etags(c):
+    existing = {row[1] for row in c.execute("PRAGMA table_info(garment_images)").fetchall()}
+    if "etag" not in existing:
+        c.execute("ALTER TABLE garment_images ADD COLUMN etag TEXT")
+    
+    for garment_id, data in c.execute("SELECT garment_id, data FROM garment_images WHERE etag IS NULL").fetchall():
+        c.execute("UPDATE garment_images SET etag = ? WHERE garment_id = ?", (_image_etag(data), garment_id))
+
+# Content hash used as the image ETag.
+def _image_etag(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+# Inserting one garment row with its promoted columns, image and renditions.
+def _insert_row(c, metadata, image_bytes=None, renditions=None):
+    # Sanitize for JSON
+    clean_data = _sanitize_for_json({k: v for k, v in metadata.items() if k != "image_data"})
+    json_data = json.dumps(clean_data, ensure_ascii=False)
+    
+    columns = ["data"] + list(PROMOTED_COLUMNS)
+    values = [json_data] + [clean_data.get(column) for column in PROMOTED_COLUMNS]
+    placeholders = ", ".join("?" for _ in columns)
+    c.execute(f"INSERT INTO garments ({', '.join(columns)}) VALUES ({placeholders})", values)
+    garment_id = c.lastrowid
+    _apply_stats(c, clean_data, 1)
+    
+    # Older callers still pass the image as base64 in the metadata
+    if image_bytes is None and metadata.get("image_data"):
+        image_bytes = base64.b64decode(metadata["image_data"])
+    
+    if image_bytes:
+        c.execute("INSERT INTO garment_images (garment_id, data, etag) VALUES (?, ?, ?)", (garment_id, image_bytes, _image_etag(image_bytes)))
+    
+    for size, data in (renditions or {}).items():
+        _insert_rendition(c, garment_id, size, data)
+    
+    return garment_id
+
+# Inserting one image rendition.
+def _insert_rendition(c, garment_id, size, data):
+    c.execute("INSERT OR REPLACE INTO garment_image_renditions (garment_id, size, data, etag) VALUES (?, ?, ?, ?)",
+              (garment_id, size, data, _image_etag(data)))
 
 # Function to insert the garments int the data base.
-def insert_garment(metadata):
-    conn = sqlite3.connect("outfits.db")
+def insert_garment(metadata, image_bytes=None, renditions=None):
+    conn = get_connection()
     c = conn.cursor()
     
     try:
-        # Sanitize for JSON
-        clean_data = _sanitize_for_json(metadata)
-        json_data = json.dumps(clean_data, ensure_ascii=False)
-        
-        c.execute("INSERT INTO garments (data) VALUES (?)", (json_data,))
+        garment_id = _insert_row(c, metadata, image_bytes, renditions)
+        _bump_version(c)
         conn.commit()
-        garment_id = c.lastrowid
         
         return garment_id
         
@@ -37,19 +221,275 @@ def insert_garment(metadata):
         print(f"Database insert error: {e}")
         conn.rollback()
         return None
+
+# Inserting many garments in one transaction, optionally recording their source files.
+def insert_garments(metadatas, sources=None, images=None, renditions=None):
+    conn = get_connection()
+    c = conn.cursor()
+    
+    try:
+        garment_ids = []
+        for i, metadata in enumerate(metadatas):
+            garment_id = _insert_row(c, metadata, images[i] if images else None, renditions[i] if renditions else None)
+            garment_ids.append(garment_id)
+            
+            if sources:
+                c.execute("INSERT OR REPLACE INTO imported_files (source, garment_id) VALUES (?, ?)", (sources[i], garment_id))
+        
+        _bump_version(c)
+        conn.commit()
+        return garment_ids
         
-    finally:
-        conn.close()
+    except Exception as e:
+        print(f"Database batch insert error: {e}")
+        conn.rollback()
+        return []
+
+# Getting the source files already imported.
+def get_imported_sources():
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT source FROM imported_files")
+    sources = {row[0] for row in c.fetchall()}
+    return sources
 
 # Getting all the garment details.
 def get_all_garments():
-    conn = sqlite3.connect("outfits.db")
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute("SELECT id, data, created_at FROM garments ORDER BY created_at DESC")
+    return _decode_rows(c.fetchall())
+
+# Getting the raw image bytes and mime type of a garment.
+def get_garment_image(garment_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT data, mime_type FROM garment_images WHERE garment_id = ?", (garment_id,))
+    row = c.fetchone()
+    return (bytes(row[0]), row[1]) if row else (None, None)
+
+# Getting a stored rendition as (bytes, mime type, etag).
+def get_garment_rendition(garment_id, size):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT data, mime_type, etag FROM garment_image_renditions WHERE garment_id = ? AND size = ?", (garment_id, size))
+    row = c.fetchone()
+    return (bytes(row[0]), row[1], row[2]) if row else (None, None, None)
+
+# Saving a rendition generated after upload, returning its ETag even when the save fails.
+def save_garment_rendition(garment_id, size, data):
+    conn = get_connection()
+    c = conn.cursor()
+    
+    try:
+        _insert_rendition(c, garment_id, size, data)
+        conn.commit()
+    except Exception as e:
+        print(f"Database rendition insert error: {e}")
+        conn.rollback()
+    return _image_etag(data)
+
+# Getting the ETag, mime type and upload time of a garment image without its bytes.
+def get_garment_image_info(garment_id):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT i.etag, i.mime_type, g.created_at
+        FROM garment_images i JOIN garments g ON g.id = i.garment_id
+        WHERE i.garment_id = ?
+    """, (garment_id,))
+    row = c.fetchone()
+    return {"etag": row[0], "mime_type": row[1], "created_at": row[2]} if row else None
+
+# Versioned URL of a garment image, None when it has no image.
+def garment_image_url(garment_id, etag=None, size=None):
+    if etag is None:
+        info = get_garment_image_info(garment_id)
+        if not info:
+            return None
+        etag = info["etag"]
+    url = f"/garments/{garment_id}/image?v={etag[:16]}"
+    return f"{url}&size={size}" if size else url
+
+# Image ETags of many garments with one query, garments without an image are left out.
+def _image_etags(garment_ids):
+    conn = get_connection()
+    c = conn.cursor()
+    
+    # Looking up only the listed garments, in chunks below SQLite's parameter limit
+    ids = list({gid for gid in garment_ids if gid is not None})
+    etags = {}
+    for start in range(0, len(ids), SQL_PARAM_CHUNK):
+        chunk = ids[start:start + SQL_PARAM_CHUNK]
+        c.execute(f"SELECT garment_id, etag FROM garment_images WHERE garment_id IN ({', '.join('?' for _ in chunk)})", chunk)
+        etags.update(c.fetchall())
+    return etags
+
+# Versioned image URLs of many garments with one query, keyed by garment id.
+def garment_image_urls(garment_ids, size=None):
+    etags = _image_etags(garment_ids)
+    return {gid: garment_image_url(gid, etag, size) for gid, etag in etags.items()}
+
+# Adding image and thumbnail URLs to a list of garments with one query.
+def attach_image_urls(garments, thumbnail_size=None):
+    etags = _image_etags(g["db_id"] for g in garments)
+    for g in garments:
+        etag = etags.get(g["db_id"])
+        g["image_url"] = garment_image_url(g["db_id"], etag) if etag else None
+        if thumbnail_size:
+            g["thumbnail_url"] = garment_image_url(g["db_id"], etag, thumbnail_size) if etag else None
+    return garments
+
+# Getting garments filtered by their promoted columns in SQL.
+def get_garments(categories=None, formality=None, color_family=None, confidence_band=None, min_insulation=None, max_insulation=None):
+    where, params = _filter_clause(categories, formality, color_family, confidence_band, min_insulation, max_insulation)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT id, data, created_at FROM garments {where} ORDER BY created_at DESC", params)
+    return _decode_rows(c.fetchall())
+
+# Getting one page of garments, newest first, with the cursor for the next page.
+def get_garments_page(limit, cursor=None, categories=None, formality=None, color_family=None, confidence_band=None, min_insulation=None, max_insulation=None):
+    where, params = _filter_clause(categories, formality, color_family, confidence_band, min_insulation, max_insulation)
+    
+    # Continuing after the last row of the previous page
+    if cursor:
+        created_at, garment_id = _decode_cursor(cursor)
+        where = f"{where} AND " if where else "WHERE "
+        where += "(created_at < ? OR (created_at = ? AND id < ?))"
+        params.extend([created_at, created_at, garment_id])
+    
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT id, data, created_at FROM garments {where} ORDER BY created_at DESC, id DESC LIMIT ?", params + [limit + 1])
     rows = c.fetchall()
-    conn.close()
     
+    next_cursor = _encode_cursor(rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+    return _decode_rows(rows[:limit]), next_cursor
+
+# Aggregate changes one garment makes, as (dimension, key, amount).
+def _stat_changes(garment):
+    changes = [
+        ("total", "", 1),
+        ("category", garment.get("primary_category", "Unknown"), 1),
+        ("formality", garment.get("formality_level", "Casual"), 1),
+        ("confidence_band", garment.get("confidence_band", "Low"), 1),
+        ("confidence_sum", "", garment.get("confidence_score", 0.0) or 0.0),
+    ]
+    changes.extend(("seasonality", season, 1) for season in garment.get("seasonality", []))
+    
+    if garment.get("needs_review"):
+        changes.append(("needs_review", "", 1))
+    
+    return changes
+
+# Adding (sign 1) or removing (sign -1) one garment from the aggregates.
+def _apply_stats(c, garment, sign):
+    c.executemany("""
+        INSERT INTO wardrobe_stats (dimension, key, value) VALUES (?, ?, ?)
+        ON CONFLICT (dimension, key) DO UPDATE SET value = value + excluded.value
+    """, [(dimension, str(key), sign * amount) for dimension, key, amount in _stat_changes(garment)])
+    c.execute("DELETE FROM wardrobe_stats WHERE value = 0 AND dimension != 'confidence_sum'")
+
+# Recomputing the aggregates from every stored garment.
+def _rebuild_stats(c):
+    c.execute("DELETE FROM wardrobe_stats")
+    for (data,) in c.execute("SELECT data FROM garments").fetchall():
+        try:
+            _apply_stats(c, json.loads(data), 1)
+        except json.JSONDecodeError:
+            continue
+
+# Repairing the aggregates.
+def rebuild_wardrobe_stats():
+    conn = get_connection()
+    c = conn.cursor()
+    _rebuild_stats(c)
+    conn.commit()
+
+# Reading the aggregates as {dimension: {key: value}}.
+def _read_stats():
+    conn = get_connection()
+    c = conn.cursor()
+    stats = {}
+    for dimension, key, value in c.execute("SELECT dimension, key, value FROM wardrobe_stats").fetchall():
+        stats.setdefault(dimension, {})[key] = value
+    return stats
+
+# Getting the full wardrobe stats from the aggregates.
+def get_wardrobe_stats():
+    raw = _read_stats()
+    total = int(raw.get("total", {}).get("", 0))
+    
+    def counts(dimension):
+        return {k: int(v) for k, v in raw.get(dimension, {}).items()}
+    
+    return {
+        "total_items": total,
+        "by_category": counts("category"),
+        "by_formality": counts("formality"),
+        "by_seasonality": counts("seasonality"),
+        "by_confidence_band": counts("confidence_band"),
+        "avg_confidence": round(raw.get("confidence_sum", {}).get("", 0.0) / total, 2) if total else 0.0,
+        "needs_review_count": int(raw.get("needs_review", {}).get("", 0)),
+    }
+
+# Getting the /wardrobe summary from the aggregates.
+def get_wardrobe_summary():
+    stats = get_wardrobe_stats()
+    by_confidence = {"High": 0, "Medium": 0, "Low": 0}
+    for band, count in stats["by_confidence_band"].items():
+        if band in by_confidence:
+            by_confidence[band] = count
+    
+    return {
+        "total": stats["total_items"],
+        "by_category": stats["by_category"],
+        "by_confidence": by_confidence,
+        "needs_review": stats["needs_review_count"],
+    }
+
+# Building the WHERE clause for the promoted column filters.
+def _filter_clause(categories=None, formality=None, color_family=None, confidence_band=None, min_insulation=None, max_insulation=None):
+    conditions = []
+    params = []
+    
+    if categories:
+        if isinstance(categories, str):
+            categories = [categories]
+        conditions.append(f"primary_category IN ({', '.join('?' for _ in categories)})")
+        params.extend(categories)
+    
+    for column, value in (("formality_level", formality), ("color_family", color_family), ("confidence_band", confidence_band)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    
+    if min_insulation is not None:
+        conditions.append("insulation_score >= ?")
+        params.append(min_insulation)
+    if max_insulation is not None:
+        conditions.append("insulation_score <= ?")
+        params.append(max_insulation)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+# Opaque page cursor from the last row's created_at and id.
+def _encode_cursor(created_at, garment_id):
+    return base64.urlsafe_b64encode(f"{created_at}|{garment_id}".encode()).decode()
+
+# Reading a page cursor back.
+def _decode_cursor(cursor):
+    try:
+        created_at, garment_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return created_at, int(garment_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+# Decoding garment rows.
+def _decode_rows(rows):
     garments = []
     for row in rows:
         try:
@@ -65,11 +505,10 @@ def get_all_garments():
 
 # Getting garments by their id.
 def get_garment_by_id(garment_id):
-    conn = sqlite3.connect("outfits.db")
+    conn = get_connection()
     c = conn.cursor()
     c.execute("SELECT id, data FROM garments WHERE id = ?", (garment_id,))
     row = c.fetchone()
-    conn.close()
     
     if row:
         try:
@@ -83,11 +522,132 @@ def get_garment_by_id(garment_id):
 
 # Deleting garments.
 def delete_garment(garment_id):
-    conn = sqlite3.connect("outfits.db")
+    conn = get_connection()
     c = conn.cursor()
+    row = c.execute("SELECT data FROM garments WHERE id = ?", (garment_id,)).fetchone()
     c.execute("DELETE FROM garments WHERE id = ?", (garment_id,))
+    
+    # Only the delete that removed the row updates the aggregates, a concurrent one removes nothing
+    if row and c.rowcount == 1:
+        try:
+            _apply_stats(c, json.loads(row[0]), -1)
+        except json.JSONDecodeError as e:
+            print(f"Error decoding garment {garment_id}: {e}")
+        _bump_version(c)
+    conn.commit()
+
+# Getting the current wardrobe version.
+def get_wardrobe_version():
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT value FROM wardrobe_meta WHERE key = 'version'")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+# Bumping the wardrobe version inside the caller's transaction.
+def _bump_version(c):
+    c.execute("UPDATE wardrobe_meta SET value = value + 1 WHERE key = 'version'")
+
+# Creating an upload job row owned by the process that will run it.
+def create_upload_job(job_id, total, created_at, owner_pid):
+    conn = get_connection()
+    images = [{"index": i, "status": "queued"} for i in range(total)]
+    conn.execute(
+        "INSERT INTO upload_jobs (id, status, total, images, created_at, owner_pid, updated_at) VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+        (job_id, total, json.dumps(images), created_at, owner_pid, created_at)
+    )
+    conn.commit()
+
+# Getting an upload job, None when unknown.
+def get_upload_job(job_id):
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT id, status, total, processed, images, results, errors, created_at, finished_at, owner_pid, updated_at FROM upload_jobs WHERE id = ?",
+        (job_id,)
+    ).fetchone()
+    if not row:
+        return None
+
+    return {
+        "id": row[0],
+        "status": row[1],
+        "total": row[2],
+        "processed": row[3],
+        "images": json.loads(row[4]),
+        "results": json.loads(row[5]),
+        "errors": json.loads(row[6]),
+        "created_at": row[7],
+        "finished_at": row[8],
+        "owner_pid": row[9],
+        "updated_at": row[10],
+    }
+
+# Setting an upload job's status, marking every image with image_status when given.
+def set_upload_job_status(job_id, status, image_status=None, finished_at=None):
+    conn = get_connection()
+    conn.execute("UPDATE upload_jobs SET status = ?, finished_at = COALESCE(?, finished_at), updated_at = ? WHERE id = ?", (status, finished_at, time.time(), job_id))
+    if image_status:
+        conn.execute("""
+            UPDATE upload_jobs SET images = (
+                SELECT json_group_array(json_set(value, '$.status', ?)) FROM json_each(upload_jobs.images)
+            ) WHERE id = ?
+        """, (image_status, job_id))
+    conn.commit()
+
+# Recording one processed image of an upload job.
+def record_upload_job_image(job_id, idx, image, result=None, error=None):
+    conn = get_connection()
+    result_json = json.dumps(_sanitize_for_json(result)) if result is not None else None
+    conn.execute("""
+        UPDATE upload_jobs SET
+            processed = processed + 1,
+            updated_at = ?,
+            images = json_set(images, ?, json(?)),
+            results = CASE WHEN ? IS NULL THEN results ELSE json_insert(results, '$[#]', json(?)) END,
+            errors = CASE WHEN ? IS NULL THEN errors ELSE json_insert(errors, '$[#]', ?) END
+        WHERE id = ?
+    """, (
+        time.time(),
+        f"$[{int(idx)}]", json.dumps(_sanitize_for_json(image)),
+        result_json, result_json,
+        error, error,
+        job_id,
+    ))
+    conn.commit()
+
+# Heartbeat for the unfinished upload jobs of a process.
+def touch_upload_jobs(owner_pid, now):
+    conn = get_connection()
+    conn.execute("UPDATE upload_jobs SET updated_at = ? WHERE owner_pid = ? AND status IN ('queued', 'running')", (now, owner_pid))
+    conn.commit()
+
+# Failing an unfinished upload job whose last heartbeat is older than the cutoff.
+# Images still waiting get the error, returns whether the job was failed.
+def fail_stale_upload_job(job_id, cutoff, now, error):
+    conn = get_connection()
+    cursor = conn.execute("""
+        UPDATE upload_jobs SET
+            status = 'failed',
+            finished_at = ?,
+            updated_at = ?,
+            images = (
+                SELECT json_group_array(CASE
+                    WHEN json_extract(value, '$.status') IN ('queued', 'processing')
+                    THEN json_set(value, '$.status', 'error', '$.error', ?)
+                    ELSE json(value) END)
+                FROM json_each(upload_jobs.images)
+            ),
+            errors = json_insert(errors, '$[#]', ?)
+        WHERE id = ? AND status IN ('queued', 'running') AND updated_at < ?
+    """, (now, now, error, error, job_id, cutoff))
+    conn.commit()
+    return cursor.rowcount == 1
+
+# Dropping upload jobs finished before the cutoff time.
+def prune_upload_jobs(cutoff):
+    conn = get_connection()
+    conn.execute("DELETE FROM upload_jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
     conn.commit()
-    conn.close()
 
 # Final json.
 def _sanitize_for_json(data):
@@ -99,4 +659,14 @@ def _sanitize_for_json(data):
         return data
     else:
         # Converting any other type to string
-        return str(data)
\ No newline at end of file
+        return str(data)
+
+# Rebuilding the aggregates: python database.py rebuild-stats
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["rebuild-stats"]:
+        init_db()
+        rebuild_wardrobe_stats()
+        print("Wardrobe stats rebuilt.")
+    else:
+        print("Usage: python database.py rebuild-stats")
@@ -59,6 +59,7 @@ def derive_metadata(clip_signals, color_data):
     
     # Colour family
     meta["color_family"] = color_data.get("color_family", "Neutral")
+    meta["color_palette"] = color_data.get("palette", [])
     
     # Confidence level
     confidence = _calculate_confidence(clip_signals, meta, cat_scores, weight_scores, formality_scores)
@@ -0,0 +1,121 @@
+# Attribute index over the wardrobe.
+# Garments are bucketed by category, color family, formality and rain safety, and every
+# bucket is kept sorted by insulation so insulation windows are a bisect range query.
+# Built once per wardrobe version by wardrobe_cache, garments in it must not be modified.
+
+# Importing the required libraries.
+from bisect import bisect_left, bisect_right
+
+# Attributes making up a bucket key, with the defaults used elsewhere in the recommender.
+def bucket_key(garment):
+    return (
+        garment.get("primary_category", "Unknown"),
+        garment.get("color_family", "Neutral"),
+        garment.get("formality_level", "Casual").lower(),
+        garment.get("rain_safe", "unknown"),
+    )
+
+# Sorting a group by insulation, keeping wardrobe order for equal scores.
+def _sorted_group(entries):
+    entries.sort(key=lambda e: (e[0], e[1]))
+    return {
+        "insulation": [e[0] for e in entries],
+        "rank": [e[1] for e in entries],
+        "garments": [e[2] for e in entries],
+    }
+
+# Building the index from the parsed wardrobe.
+def build_index(garments):
+    buckets = {}
+    categories = {}
+    for rank, g in enumerate(garments):
+        entry = (g.get("insulation_score", 50), rank, g)
+        key = bucket_key(g)
+        buckets.setdefault(key, []).append(entry)
+        categories.setdefault(key[0], []).append(entry)
+
+    return {
+        "buckets": {key: _sorted_group(entries) for key, entries in buckets.items()},
+        "categories": {category: _sorted_group(entries) for category, entries in categories.items()},
+    }
+
+# Number of garments in a category.
+def category_size(index, category):
+    group = index["categories"].get(category)
+    return len(group["garments"]) if group else 0
+
+# Rain safety values present in a category.
+def rain_safe_values(index, category):
+    return {key[3] for key in index["buckets"] if key[0] == category}
+
+# Groups of a category matching the attribute filters, as (key, group).
+# Filters left as None match everything, the whole category is a single group then unless by_bucket.
+def _groups(index, category, color_families=None, formality_levels=None, rain_safe=None, by_bucket=False):
+    if color_families is None and formality_levels is None and rain_safe is None and not by_bucket:
+        group = index["categories"].get(category)
+        return [((category, None, None, None), group)] if group else []
+
+    formality_levels = [f.lower() for f in formality_levels] if formality_levels is not None else None
+    found = []
+    for key, group in index["buckets"].items():
+        bucket_category, color, formality, rain = key
+        if bucket_category != category:
+            continue
+        if color_families is not None and color not in color_families:
+            continue
+        if formality_levels is not None and formality not in formality_levels:
+            continue
+        if rain_safe is not None and rain not in rain_safe:
+            continue
+        found.append((key, group))
+    return found
+
+# Positions of a group whose insulation lies in [low, high].
+def _window(group, low=None, high=None):
+    start = 0 if low is None else bisect_left(group["insulation"], low)
+    end = len(group["insulation"]) if high is None else bisect_right(group["insulation"], high)
+    return start, end
+
+# Garments as (insulation, wardrobe rank, garment) with insulation in [low, high].
+def insulation_range(index, category, low=None, high=None, **filters):
+    found = []
+    for _, group in _groups(index, category, **filters):
+        start, end = _window(group, low, high)
+        found.extend(zip(group["insulation"][start:end], group["rank"][start:end], group["garments"][start:end]))
+    return found
+
+# Garments just outside [low, high], the count closest on each side plus ties, as (insulation, rank, garment).
+# With filters the closest are taken per bucket, a superset of the closest matching garments.
+def nearest_outside(index, category, low, high, count, **filters):
+    found = []
+    for _, group in _groups(index, category, **filters):
+        scores = group["insulation"]
+        start, end = _window(group, low, high)
+
+        # Widening each side to every garment tied with the last one taken
+        first = bisect_left(scores, scores[start - count]) if start > count else 0
+        last = bisect_right(scores, scores[end + count - 1]) if end + count < len(scores) else len(scores)
+        below = range(first, start)
+        above = range(end, last)
+        found.extend((group["insulation"][i], group["rank"][i], group["garments"][i]) for r in (below, above) for i in r)
+    return found
+
+# Selecting garments of a category by attributes, any filter left as None matches everything.
+# insulation is an inclusive (low, high) window, either side may be None. Results are in wardrobe order.
+def select(index, category, color_families=None, formality_levels=None, rain_safe=None, insulation=None):
+    low, high = insulation if insulation else (None, None)
+    found = insulation_range(index, category, low, high, color_families=color_families, formality_levels=formality_levels, rain_safe=rain_safe)
+    found.sort(key=lambda e: e[1])
+    return [g for _, _, g in found]
+
+# Selecting garments of a category grouped by color family, each group in wardrobe order.
+# Groups are ordered by their first garment in the wardrobe.
+def select_by_color(index, category, formality_levels=None, rain_safe=None, insulation=None):
+    low, high = insulation if insulation else (None, None)
+    by_color = {}
+    for (_, color, _, _), group in _groups(index, category, formality_levels=formality_levels, rain_safe=rain_safe, by_bucket=True):
+        start, end = _window(group, low, high)
+        by_color.setdefault(color, []).extend(zip(group["rank"][start:end], group["garments"][start:end]))
+
+    by_color = {color: sorted(entries, key=lambda e: e[0]) for color, entries in by_color.items() if entries}
+    return {color: [g for _, g in entries] for color, entries in sorted(by_color.items(), key=lambda item: item[1][0][0])}
@@ -0,0 +1,118 @@
+# Background job queue for uploads.
+# Jobs run in the process that accepted them, their progress is kept in SQLite
+# so a poll can land on any worker process. The owning process keeps a heartbeat on
+# its unfinished jobs, so jobs lost with a dead process are reported as failed.
+# Importing the required libraries.
+import os
+import time
+import uuid
+import queue
+import threading
+from pipeline import analyze_uploads, store_upload
+from database import (create_upload_job, get_upload_job, set_upload_job_status, record_upload_job_image, prune_upload_jobs,
+                      touch_upload_jobs, fail_stale_upload_job)
+
+# Number of background upload workers.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+
+# Seconds a finished job stays available for polling.
+JOB_TTL = int(os.environ.get("JOB_TTL", 3600))
+
+# Seconds between heartbeats of the process running a job.
+JOB_HEARTBEAT = int(os.environ.get("JOB_HEARTBEAT", 10))
+
+# Seconds without a heartbeat after which an unfinished job counts as lost.
+JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", 60))
+
+_workers_lock = threading.Lock()
+_queue = queue.Queue()
+_workers = []
+_workers_pid = None
+
+# Adding an upload job and returning its id.
+def submit_upload_job(raws):
+    _start_workers()
+    _prune_jobs()
+
+    job_id = uuid.uuid4().hex
+    create_upload_job(job_id, len(raws), time.time(), os.getpid())
+    _queue.put((job_id, raws))
+
+    return job_id
+
+# Getting a snapshot of a job for polling, failing it when its process stopped reporting.
+def get_job(job_id):
+    job = get_upload_job(job_id)
+    if not job or job["status"] not in ("queued", "running"):
+        return job
+
+    now = time.time()
+    if job["updated_at"] < now - JOB_STALE_AFTER and fail_stale_upload_job(job_id, now - JOB_STALE_AFTER, now, "Upload was interrupted, please try again"):
+        print(f"Upload job {job_id} of process {job['owner_pid']} lost its heartbeat")
+        job = get_upload_job(job_id)
+    return job
+
+# Starting the worker and heartbeat threads once per process.
+def _start_workers():
+    global _queue, _workers, _workers_pid
+    with _workers_lock:
+        # Threads are not inherited by forked worker processes, the queue starts empty there
+        if _workers and _workers_pid == os.getpid():
+            return
+
+        _queue = queue.Queue()
+        _workers = []
+        _workers_pid = os.getpid()
+        for i in range(max(1, JOB_WORKERS)):
+            worker = threading.Thread(target=_worker_loop, name=f"upload-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        threading.Thread(target=_heartbeat_loop, name="upload-heartbeat", daemon=True).start()
+
+# Refreshing the heartbeat of this process's unfinished jobs forever.
+def _heartbeat_loop():
+    while True:
+        time.sleep(JOB_HEARTBEAT)
+        try:
+            touch_upload_jobs(os.getpid(), time.time())
+        except Exception as e:
+            print(f"Upload job heartbeat failed: {e}")
+
+# Processing queued jobs forever.
+def _worker_loop():
+    while True:
+        job_id, raws = _queue.get()
+        try:
+            _run_job(job_id, raws)
+        except Exception as e:
+            print(f"Upload job {job_id} failed: {e}")
+            _update_job(job_id, status="failed")
+        finally:
+            _queue.task_done()
+
+# Running the upload pipeline and recording progress per image.
+def _run_job(job_id, raws):
+    set_upload_job_status(job_id, "running", image_status="processing")
+
+    for idx, metadata, bg_removed_bytes, error in analyze_uploads(raws):
+        result = None
+        if not error:
+            result = store_upload(idx, metadata, bg_removed_bytes)
+            if not result:
+                error = f"Failed to save garment {idx + 1}"
+
+        if error:
+            record_upload_job_image(job_id, idx, {"index": idx, "status": "error", "error": error}, error=error)
+        else:
+            record_upload_job_image(job_id, idx, {"index": idx, "status": "done", "garment_id": result["id"]}, result=result)
+
+    _update_job(job_id, status="done")
+
+# Updating a job's status, stamping the finish time when it ends.
+def _update_job(job_id, status):
+    finished_at = time.time() if status in ("done", "failed") else None
+    set_upload_job_status(job_id, status, finished_at=finished_at)
+
+# Dropping finished jobs older than the TTL.
+def _prune_jobs():
+    prune_upload_jobs(time.time() - JOB_TTL)
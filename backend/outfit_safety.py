@@ -1,5 +1,15 @@
 #importing required library
+import os
 import random
+import numpy as np
+from color_extractor import distinct_palette_colors
+from garment_index import select, select_by_color
+
+# How select_best_outfit picks among valid outfits: uniform, weighted or random.
+SELECTION_MODE = os.environ.get("OUTFIT_SELECTION_MODE", "uniform")
+
+# Formality levels required for formal events and preferred for smart-casual ones.
+FORMAL_LEVELS = ["formal", "smart-casual"]
 
 # Weather constants
 EXTREME_COLD = 0
@@ -24,12 +34,29 @@ def create_weather_profile(temperature_celsius, weather_condition="sunny"):
         "condition": weather_condition.lower()
     }
 
+# Smallest palette share for a distinct color to count as a pattern.
+PATTERN_MIN_SHARE = 0.15
+
+# Distinct colors making up a visible share of the garment, shades of one color merged.
+def _palette_colors(metadata):
+    return [
+        c for c in distinct_palette_colors(metadata.get("color_palette") or [])
+        if c["share"] >= PATTERN_MIN_SHARE
+    ]
+
+# Checking if a garment is patterned or multi-colored.
+def is_patterned(metadata):
+    return len(_palette_colors(metadata)) > 1
+
 # Aassigning color roles.
 def assign_color_role(metadata):
 
     color_family = metadata.get("color_family", "Neutral")
     
     if color_family in ["Neutral", "Dark"]:
+        # Patterned items with an accent color read as accents
+        if is_patterned(metadata) and {c["color_family"] for c in _palette_colors(metadata)} - {"Neutral", "Dark"}:
+            return "accent"
         return "base"
     
     if color_family in ["Light", "Earth", "Bright"]:
@@ -104,6 +131,10 @@ def validate_color_rules(pieces):
     if accent_count > 1:
         return False
     
+    # Maximum patterned piece
+    if sum(1 for p in pieces if is_patterned(p)) > 1:
+        return False
+    
     # No bright bottoms
     for piece in pieces:
         if piece.get("color_role") == "accent":
@@ -269,7 +300,16 @@ def score_outfit(top, bottom, outerwear, temperature_celsius, event_formality="c
     return max(0.0, round(score, 2))
 
 # Best outfit with strict weather filtering and randomization
-def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, event_formality = "casual", weather_condition = "sunny"):
+# mode is "uniform" or "weighted" to pick from every valid combination, or "random" for the retry loop.
+def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, event_formality = "casual", weather_condition = "sunny", mode = None, seed = None):
+    pool = build_candidate_pool(tops, bottoms, outerwear_items, temperature_celsius, event_formality, weather_condition, mode)
+    if not pool:
+        return None
+    return pick_from_pool(pool, temperature_celsius, event_formality, weather_condition, seed)
+
+# Filtering the garments into the pool select_best_outfit picks from, None when nothing fits.
+# The pool only depends on the garments and conditions, so it can be cached and picked from many times.
+def build_candidate_pool(tops, bottoms, outerwear_items, temperature_celsius, event_formality = "casual", weather_condition = "sunny", mode = None):
     weather_profile = create_weather_profile(temperature_celsius, weather_condition)
     
     # Filter by weather appropriateness first
@@ -277,6 +317,29 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
     valid_bottoms = _filter_by_weather(bottoms, weather_profile)
     valid_outer = _filter_by_weather(outerwear_items, weather_profile)
     
+    return _candidate_pool(valid_tops, valid_bottoms, valid_outer, weather_profile, event_formality, mode)
+
+# Building the candidate pool of the whole wardrobe from its index.
+# The weather filter is an insulation window query and formal color matching uses the color buckets.
+def build_indexed_candidate_pool(index, temperature_celsius, event_formality = "casual", weather_condition = "sunny", mode = None):
+    weather_profile = create_weather_profile(temperature_celsius, weather_condition)
+    
+    valid_tops = _weather_candidates(index, "Top", weather_profile)
+    valid_bottoms = _weather_candidates(index, "Bottom", weather_profile)
+    valid_outer = _weather_candidates(index, "Outerwear", weather_profile)
+    
+    color_groups = None
+    if event_formality.lower() == "formal":
+        color_groups = {category: _formal_color_groups(index, category, weather_profile) for category in ("Bottom", "Outerwear")}
+    
+    return _candidate_pool(valid_tops, valid_bottoms, valid_outer, weather_profile, event_formality, mode, color_groups)
+
+# Filtering weather-appropriate garments by the event into a candidate pool.
+# color_groups holds formal bottoms and outerwear by color family when they come from the index.
+def _candidate_pool(valid_tops, valid_bottoms, valid_outer, weather_profile, event_formality, mode, color_groups = None):
+    mode = (mode or SELECTION_MODE).lower()
+    temperature_celsius = weather_profile["temperature"]
+    
     # Adding None for outerwear in mild weather
     if not weather_profile["is_extreme_cold"] and not weather_profile["is_very_cold"]:
         if temperature_celsius >= 18 and not weather_profile["is_wet"] and not weather_profile["is_windy"]:
@@ -302,30 +365,26 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
     elif event_formality_lower == "smart-casual" or event_formality_lower == "smart casual":
         # Filter tops with smart-casual tags first
         smart_casual_tops = [t for t in valid_tops 
-                            if t.get("formality_level", "").lower() in ["smart-casual", "formal"]]
+                            if t.get("formality_level", "").lower() in FORMAL_LEVELS]
         
         # If no smart-casual tops then valid tops
         filtered_tops = smart_casual_tops if smart_casual_tops else valid_tops
         
         # For bottoms, prefering smart-casual/formal
         smart_casual_bottoms = [b for b in valid_bottoms 
-                               if b.get("formality_level", "").lower() in ["smart-casual", "formal"]]
+                               if b.get("formality_level", "").lower() in FORMAL_LEVELS]
         filtered_bottoms = smart_casual_bottoms if smart_casual_bottoms else valid_bottoms
         
         # For outerwear, prefering smart-casual/formal
         smart_casual_outer = [o for o in valid_outer if o is not None 
-                             and o.get("formality_level", "").lower() in ["smart-casual", "formal"]]
+                             and o.get("formality_level", "").lower() in FORMAL_LEVELS]
         filtered_outer = smart_casual_outer if smart_casual_outer else valid_outer
     
     # FORMAL: Formal metadata tags, strict color coordination
     elif event_formality_lower == "formal":
         # Filter
         formal_tops = [t for t in valid_tops 
-                      if t.get("formality_level", "").lower() in ["formal", "smart-casual"]]
-        formal_bottoms = [b for b in valid_bottoms 
-                         if b.get("formality_level", "").lower() in ["formal", "smart-casual"]]
-        formal_outer = [o for o in valid_outer if o is not None 
-                       and o.get("formality_level", "").lower() in ["formal", "smart-casual"]]
+                      if t.get("formality_level", "").lower() in FORMAL_LEVELS]
 
         # No formal items
         if not formal_tops:
@@ -333,8 +392,17 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
             return None
         
         filtered_tops = formal_tops
-        filtered_bottoms = formal_bottoms if formal_bottoms else valid_bottoms
-        filtered_outer = formal_outer if formal_outer else [o for o in valid_outer if o is not None]
+        if color_groups is not None:
+            # Bottoms and outerwear of one color are next to each other, their rows are a range
+            filtered_bottoms = [b for group in color_groups["Bottom"].values() for b in group]
+            filtered_outer = [o for group in color_groups["Outerwear"].values() for o in group]
+        else:
+            formal_bottoms = [b for b in valid_bottoms 
+                             if b.get("formality_level", "").lower() in FORMAL_LEVELS]
+            formal_outer = [o for o in valid_outer if o is not None 
+                           and o.get("formality_level", "").lower() in FORMAL_LEVELS]
+            filtered_bottoms = formal_bottoms if formal_bottoms else valid_bottoms
+            filtered_outer = formal_outer if formal_outer else [o for o in valid_outer if o is not None]
     
     else:
         # Default logic
@@ -342,10 +410,60 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
         filtered_bottoms = valid_bottoms
         filtered_outer = valid_outer
 
+    pool = {
+        "mode": mode,
+        "tops": filtered_tops,
+        "bottoms": filtered_bottoms,
+        "outerwear": filtered_outer,
+        "weather_profile": weather_profile,
+    }
+    
+    # Valid combinations are only enumerated once per pool
+    if mode != "random":
+        pool.update(_combination_pool(filtered_tops, filtered_bottoms, filtered_outer, weather_profile, event_formality, color_groups))
+    
+    return pool
+
+# Picking one outfit from a candidate pool and scoring it for the actual conditions.
+def pick_from_pool(pool, temperature_celsius, event_formality = "casual", weather_condition = "sunny", seed = None):
+    # Choosing the combination
+    if pool["mode"] == "random":
+        choice = _pick_by_retries(pool["tops"], pool["bottoms"], pool["outerwear"], pool["weather_profile"], event_formality.lower(), random.Random(seed))
+    else:
+        choice = _pick_from_combinations(pool, temperature_celsius, event_formality, weather_condition, seed)
+    
+    if not choice:
+        return None
+    return describe_outfit(*choice, temperature_celsius, event_formality, weather_condition)
+
+# Scoring and explaining a chosen outfit.
+def describe_outfit(top, bottom, outerwear, temperature_celsius, event_formality = "casual", weather_condition = "sunny"):
+    weather_profile = create_weather_profile(temperature_celsius, weather_condition)
+    
+    final_score = score_outfit(top, bottom, outerwear, 
+                               temperature_celsius, event_formality, weather_condition)
+    
+    reasoning = _generate_reasoning(
+        {"top": top, "bottom": bottom, "outerwear": outerwear},
+        weather_profile,
+        event_formality
+    )
+    
+    return {
+        "top": top,
+        "bottom": bottom,
+        "outerwear": outerwear,
+        "score": final_score,
+        "reasoning": reasoning
+    }
+
+# Picking an outfit by random retries.
+def _pick_by_retries(filtered_tops, filtered_bottoms, filtered_outer, weather_profile, event_formality_lower, rng):
+    temperature_celsius = weather_profile["temperature"]
     max_attempts = 30 if event_formality_lower == "formal" else 20
     
     for attempt in range(max_attempts):
-        chosen_top = random.choice(filtered_tops)
+        chosen_top = rng.choice(filtered_tops)
         
         # FORMAL: Strict color matching
         if event_formality_lower == "formal":
@@ -367,7 +485,7 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
             if not matching_bottoms:
                 continue
             
-            chosen_bottom = random.choice(matching_bottoms)
+            chosen_bottom = rng.choice(matching_bottoms)
             
             # Need outerwear for cold weather
             chosen_outer = None
@@ -378,21 +496,21 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
                         # Matching outerwear color with top/bottom
                         matching_outer = [o for o in valid_outer_only 
                                          if o.get("color_family") in [top_color, "Neutral", "Dark"]]
-                        chosen_outer = random.choice(matching_outer) if matching_outer else random.choice(valid_outer_only)
+                        chosen_outer = rng.choice(matching_outer) if matching_outer else rng.choice(valid_outer_only)
         
         # SMART CASUAL: Prioritizing smart-casual items, then color
         elif event_formality_lower == "smart-casual" or event_formality_lower == "smart casual":
             # Bottom
-            chosen_bottom = random.choice(filtered_bottoms)
+            chosen_bottom = rng.choice(filtered_bottoms)
             
             # Choosing outerwear if needed
             chosen_outer = None
             if weather_profile["is_extreme_cold"] or weather_profile["is_very_cold"]:
                 valid_outer_only = [o for o in filtered_outer if o is not None]
                 if valid_outer_only:
-                    chosen_outer = random.choice(valid_outer_only)
+                    chosen_outer = rng.choice(valid_outer_only)
             else:
-                chosen_outer = random.choice(filtered_outer) if filtered_outer else None
+                chosen_outer = rng.choice(filtered_outer) if filtered_outer else None
             
             # Colour rules
             pieces = [chosen_top, chosen_bottom]
@@ -404,16 +522,16 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
         
         # CASUAL: Weather + color focus
         else:
-            chosen_bottom = random.choice(filtered_bottoms)
+            chosen_bottom = rng.choice(filtered_bottoms)
             
             if weather_profile["is_extreme_cold"] or weather_profile["is_very_cold"]:
                 valid_outer_only = [o for o in filtered_outer if o is not None]
                 if valid_outer_only:
-                    chosen_outer = random.choice(valid_outer_only)
+                    chosen_outer = rng.choice(valid_outer_only)
                 else:
                     continue
             else:
-                chosen_outer = random.choice(filtered_outer) if filtered_outer else None
+                chosen_outer = rng.choice(filtered_outer) if filtered_outer else None
             
             pieces = [chosen_top, chosen_bottom]
             if chosen_outer:
@@ -422,72 +540,173 @@ def select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, even
             if not validate_color_rules(pieces):
                 continue
         
-        # Final score and return
-        final_score = score_outfit(chosen_top, chosen_bottom, chosen_outer, 
-                                   temperature_celsius, event_formality, weather_condition)
-        
-        reasoning = _generate_reasoning(
-            {"top": chosen_top, "bottom": chosen_bottom, "outerwear": chosen_outer},
-            weather_profile,
-            event_formality
-        )
-        
-        return {
-            "top": chosen_top,
-            "bottom": chosen_bottom,
-            "outerwear": chosen_outer,
-            "score": final_score,
-            "reasoning": reasoning
-        }
+        return chosen_top, chosen_bottom, chosen_outer
     
     return None
 
-# Best outfit compatibility
-def select_best_outfit_separate(tops, bottoms, outerwear_items, temperature_celsius, event_formality, weather_condition):
-    return select_best_outfit(tops, bottoms, outerwear_items, temperature_celsius, event_formality, weather_condition)
+# Color rule inputs of each garment, in the same terms as validate_color_rules.
+def _color_rule_arrays(garments):
+    accent = np.array([g.get("color_role") == "accent" for g in garments], dtype=int)
+    patterned = np.array([is_patterned(g) for g in garments], dtype=int)
+    bright_bottom = np.array([
+        g.get("color_role") == "accent" and g.get("primary_category") == "Bottom" and g.get("color_family") == "Bright"
+        for g in garments
+    ], dtype=bool)
+    return accent, patterned, bright_bottom
 
-# Filtering garments by weather condition.
-def _filter_by_weather(garments, weather_profile):
+# Marking every (top, bottom, outerwear) combination the retry loop could accept, as (T, B, O + 1).
+# Index 0 on the last axis is "no outerwear".
+def _valid_combinations(filtered_tops, filtered_bottoms, outer_only, has_none, weather_profile, event_formality_lower, color_groups=None):
+    nt, nb, no = len(filtered_tops), len(filtered_bottoms), len(outer_only)
+    cold = weather_profile["is_extreme_cold"] or weather_profile["is_very_cold"]
+    
+    # FORMAL: bottoms and outerwear looked up by the top's color family
+    if event_formality_lower == "formal":
+        if color_groups is not None:
+            bottoms_by_color = _color_ranges(color_groups["Bottom"])
+            outer_by_color = _color_ranges(color_groups["Outerwear"], start=1)
+        else:
+            bottoms_by_color = {}
+            for j, b in enumerate(filtered_bottoms):
+                bottoms_by_color.setdefault(b.get("color_family", "Neutral"), []).append(j)
+            outer_by_color = {}
+            for k, o in enumerate(outer_only, start=1):
+                outer_by_color.setdefault(o.get("color_family", "Neutral"), []).append(k)
+        need_outer = (cold or weather_profile["temperature"] < 15) and no > 0
+        
+        valid = np.zeros((nt, nb, no + 1), dtype=bool)
+        for i, t in enumerate(filtered_tops):
+            top_color = t.get("color_family", "Neutral")
+            rows = bottoms_by_color.get(top_color, [])
+            if not rows:
+                fallback = ["Neutral", "Dark"] if top_color in ["Neutral", "Dark"] else ["Neutral"]
+                rows = [j for color in fallback for j in bottoms_by_color.get(color, [])]
+            
+            if need_outer:
+                cols = [k for color in dict.fromkeys([top_color, "Neutral", "Dark"]) for k in outer_by_color.get(color, [])]
+                cols = cols or list(range(1, no + 1))
+            else:
+                cols = [0]
+            if rows:
+                valid[i][np.ix_(rows, cols)] = True
+        return valid
+    
+    # Outerwear options the other modes choose from
+    allowed_outer = np.ones(no + 1, dtype=bool)
+    if cold:
+        # Smart casual goes without outerwear when there is none, casual gives up
+        allowed_outer[0] = no == 0 and event_formality_lower in ["smart-casual", "smart casual"]
+    else:
+        allowed_outer[0] = no == 0 or has_none
+    
+    # Color rules on the whole grid
+    t_accent, t_patterned, t_bright = _color_rule_arrays(filtered_tops)
+    b_accent, b_patterned, b_bright = _color_rule_arrays(filtered_bottoms)
+    o_accent, o_patterned, o_bright = (np.concatenate([[0], x]).astype(x.dtype) for x in _color_rule_arrays(outer_only))
+    
+    valid = (
+        (t_accent[:, None, None] + b_accent[None, :, None] + o_accent[None, None, :] <= 1)
+        & (t_patterned[:, None, None] + b_patterned[None, :, None] + o_patterned[None, None, :] <= 1)
+        & ~(t_bright[:, None, None] | b_bright[None, :, None] | o_bright[None, None, :])
+    )
+    return valid & allowed_outer[None, None, :]
+
+# Positions of color groups laid out one after another, by color family.
+def _color_ranges(groups, start=0):
+    ranges = {}
+    for color, group in groups.items():
+        ranges[color] = range(start, start + len(group))
+        start += len(group)
+    return ranges
 
+# Enumerating every valid combination.
+def _combination_pool(filtered_tops, filtered_bottoms, filtered_outer, weather_profile, event_formality, color_groups=None):
+    event_formality_lower = event_formality.lower()
+    outer_only = [o for o in filtered_outer if o is not None]
+    has_none = any(o is None for o in filtered_outer)
+    
+    valid = _valid_combinations(filtered_tops, filtered_bottoms, outer_only, has_none, weather_profile, event_formality_lower, color_groups)
+    # int32 positions halve the size of cached pools, the grid is far below 2**31 cells
+    cells = np.flatnonzero(valid).astype(np.int32)
+    
+    return {"outer_options": [None] + outer_only, "shape": valid.shape, "cells": cells}
+
+# Picking an outfit from the valid combinations, uniformly or weighted by score.
+# Weights are scored for the request's conditions, cached pools cover a whole degree.
+def _pick_from_combinations(pool, temperature_celsius, event_formality, weather_condition, seed):
+    cells = pool["cells"]
+    if not len(cells):
+        return None
+    
+    probabilities = None
+    if pool["mode"] == "weighted":
+        from outfit_scoring import score_cells
+        scores = score_cells(pool["tops"], pool["bottoms"], pool["outer_options"][1:], cells, temperature_celsius, event_formality, weather_condition)["scores"]
+        weights = np.maximum(scores, 0)
+        if weights.sum() > 0:
+            probabilities = weights / weights.sum()
+    
+    rng = np.random.default_rng(seed)
+    i, j, k = np.unravel_index(rng.choice(cells, p=probabilities), pool["shape"])
+    return pool["tops"][i], pool["bottoms"][j], pool["outer_options"][k]
+
+# Insulation window, as inclusive (low, high), a garment of the category needs for the weather.
+# Either side is None when unbounded.
+def _weather_window(category, weather_profile):
     temp = weather_profile["temperature"]
-    is_extreme_cold = weather_profile["is_extreme_cold"]
-    is_very_cold = weather_profile["is_very_cold"]
-    is_hot = weather_profile["is_hot"]
+    low, high = None, None
     
-    valid = []
+    # For extreme cold.
+    if weather_profile["is_extreme_cold"] and category == "Outerwear":
+        low = 45
+    
+    # Removing high insulation
+    if weather_profile["is_hot"]:
+        high = 60
+    
+    # Very poor temperature matches, outerwear in the cold is kept whatever its insulation.
+    # Below 0°C every insulation under 50 is over 40 from the ideal, above 30°C every one over 70 is.
+    if not (category == "Outerwear" and (weather_profile["is_extreme_cold"] or weather_profile["is_very_cold"])):
+        if temp < 0:
+            low = max(low or 0, 50)
+        if temp > 30:
+            high = min(high if high is not None else 100, 70)
     
+    return low, high
+
+# Filtering garments by weather condition.
+def _filter_by_weather(garments, weather_profile):
+    valid = []
     for g in garments:
         insulation = g.get("insulation_score", 50)
         category = g.get("primary_category", "Top")
-        sleeve_length = g.get("sleeve_length", "unknown")
+        low, high = _weather_window(category, weather_profile)
         
-        # For extreme cold.
-        if is_extreme_cold and category == "Outerwear":
-            if insulation < 45:
-                continue
+        if (low is not None and insulation < low) or (high is not None and insulation > high):
+            continue
         
         # Removing sleeveless tops
-        if is_very_cold and category == "Top":
-            if sleeve_length == "sleeveless":
-                continue
-        
-        # Removing high insulation
-        if is_hot:
-            if insulation > 60:
-                continue
+        if weather_profile["is_very_cold"] and category == "Top" and g.get("sleeve_length", "unknown") == "sleeveless":
+            continue
         
-        # Checking temperature using insulation
-        if category == "Outerwear" and (is_extreme_cold or is_very_cold):
-            valid.append(g)
-        else:
-            # Checking temperature match with outfit.
-            match_score = _score_temperature_match(insulation, temp, category)
-            if match_score < 0:
-                continue
-            valid.append(g)
+        valid.append(g)
     
     return valid
 
+# Weather-appropriate garments of a category looked up in the wardrobe index, in wardrobe order.
+def _weather_candidates(index, category, weather_profile):
+    garments = select(index, category, insulation=_weather_window(category, weather_profile))
+    if weather_profile["is_very_cold"] and category == "Top":
+        garments = [g for g in garments if g.get("sleeve_length", "unknown") != "sleeveless"]
+    return garments
+
+# Formal garments of a category grouped by color family from the wardrobe index,
+# falling back to every weather-appropriate one like the formal filter does.
+def _formal_color_groups(index, category, weather_profile):
+    window = _weather_window(category, weather_profile)
+    groups = select_by_color(index, category, formality_levels=FORMAL_LEVELS, insulation=window)
+    return groups or select_by_color(index, category, insulation=window)
+
 # Reason of outfit selctions.
 def _generate_reasoning(outfit, weather_profile, event_formality):
 
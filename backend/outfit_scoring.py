@@ -0,0 +1,268 @@
+# Vectorized outfit scoring over every (top, bottom, outerwear) combination.
+# Mirrors outfit_safety.score_outfit, validate_color_rules and validate_formality_match,
+# adding terms in the same order so the scores come out identical.
+
+# Importing the required libraries.
+import heapq
+import numpy as np
+from outfit_safety import create_weather_profile, is_patterned
+
+CATEGORY_WEIGHTS = {"Outerwear": 1.4, "Top": 1.0, "Bottom": 0.8}
+FORMALITY_LEVELS = {"casual": 0, "smart-casual": 1, "formal": 2}
+
+# Converting garments into per-piece arrays for one weather profile.
+def garment_arrays(garments, weather_profile):
+    temperature = weather_profile["temperature"]
+    cold = weather_profile["is_extreme_cold"] or weather_profile["is_very_cold"]
+    is_wet = weather_profile["is_wet"]
+    ideal_insulation = max(0, min(100, 95 - (temperature * 2.5)))
+
+    n = len(garments)
+    arrays = {
+        "temp_score": np.zeros(n),
+        "max_score": np.zeros(n),
+        "insulation_bonus": np.zeros(n),
+        "protection_bonus": np.zeros(n),
+        "rain_bonus": np.zeros(n),
+        "compatibility": np.zeros(n),
+        "formality": np.zeros(n, dtype=int),
+        "color": np.zeros(n, dtype=int),
+        "accent": np.zeros(n, dtype=int),
+        "bright_accent_bottom": np.zeros(n, dtype=bool),
+        "patterned": np.zeros(n, dtype=int),
+    }
+    colors = {}
+
+    for i, g in enumerate(garments):
+        category = g.get("primary_category", "Top")
+        weight = CATEGORY_WEIGHTS.get(category, 1.0)
+        insulation = g.get("insulation_score", 50)
+
+        arrays["temp_score"][i] = _temperature_match(insulation, temperature, ideal_insulation) * weight
+        arrays["max_score"][i] = 15 * weight
+
+        if category == "Outerwear":
+            if cold:
+                weather_protection = g.get("weather_protection_score", 30)
+                arrays["insulation_bonus"][i] = 12 if insulation >= 70 else 5 if insulation >= 50 else 0
+                arrays["protection_bonus"][i] = 10 if weather_protection >= 60 else 4 if weather_protection >= 40 else 0
+            if is_wet:
+                rain_safe = g.get("rain_safe", "unknown")
+                arrays["rain_bonus"][i] = 15 if rain_safe == "true" else -8 if rain_safe == "false" else 0
+
+        arrays["compatibility"][i] = g.get("compatibility_weight", 0.5)
+        arrays["formality"][i] = FORMALITY_LEVELS.get(g.get("formality_level", "Casual").lower(), 0)
+        arrays["color"][i] = colors.setdefault(g.get("color_family", "Neutral"), len(colors))
+
+        accent = g.get("color_role") == "accent"
+        arrays["accent"][i] = accent
+        arrays["bright_accent_bottom"][i] = accent and category == "Bottom" and g.get("color_family") == "Bright"
+        arrays["patterned"][i] = is_patterned(g)
+
+    return arrays, colors
+
+# Same bands as outfit_safety._score_temperature_match.
+def _temperature_match(insulation, temperature, ideal_insulation):
+    distance = abs(insulation - ideal_insulation)
+    if distance <= 10:
+        return 15
+    elif distance <= 20:
+        return 12
+    elif distance <= 30:
+        return 8
+    elif distance <= 40:
+        return 4
+    elif temperature < 0 and insulation < 50:
+        return -10
+    elif temperature > 30 and insulation > 70:
+        return -10
+    return 0
+
+# Padding outerwear arrays with a leading "no outerwear" slot.
+def _with_empty_slot(arrays):
+    padded = {}
+    for key, values in arrays.items():
+        padded[key] = np.concatenate([np.zeros(1, dtype=values.dtype), values])
+    return padded
+
+# Building per-piece arrays for tops, bottoms and outerwear (with the empty slot first).
+def _piece_arrays(tops, bottoms, outerwear, weather_profile):
+    everything = list(tops) + list(bottoms) + list(outerwear)
+    arrays, _ = garment_arrays(everything, weather_profile)
+    arrays["worn"] = np.ones(len(everything), dtype=bool)
+
+    nt, nb = len(tops), len(bottoms)
+    t = {k: v[:nt] for k, v in arrays.items()}
+    b = {k: v[nt:nt + nb] for k, v in arrays.items()}
+    o = _with_empty_slot({k: v[nt + nb:] for k, v in arrays.items()})
+    return t, b, o
+
+# Scoring broadcast blocks of pieces, returning raw scores and rule validity.
+def _score_block(t, b, o, weather_profile, event_formality):
+    has_outer = o["worn"]
+    shape = np.broadcast_shapes(t["temp_score"].shape, b["temp_score"].shape, o["temp_score"].shape)
+
+    # Weather score, summed piece by piece like calculate_weather_score
+    score = np.zeros(shape)
+    max_score = np.zeros(shape)
+    for piece in (t, b, o):
+        score = score + piece["temp_score"]
+        max_score = max_score + piece["max_score"]
+        score = score + piece["insulation_bonus"]
+        score = score + piece["protection_bonus"]
+        score = score + piece["rain_bonus"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weather_score = np.clip((score / max_score) * 50, 0, 50)
+
+    # Average compatibility weight
+    count = np.where(has_outer, 3, 2)
+    avg_weight = (t["compatibility"] + b["compatibility"] + o["compatibility"]) / count
+
+    # Formality match, the empty slot never widens the range
+    outer_formality = o["formality"]
+    high = np.maximum(np.maximum(t["formality"], b["formality"]), np.where(has_outer, outer_formality, -1))
+    low = np.minimum(np.minimum(t["formality"], b["formality"]), np.where(has_outer, outer_formality, 3))
+    formality_ok = (high - low) <= 1
+    if event_formality.lower() == "formal":
+        same_color = t["color"] == b["color"]
+        formality_ok = formality_ok & same_color & (~has_outer | (o["color"] == t["color"]))
+
+    # Color rules
+    accent_count = t["accent"] + b["accent"] + o["accent"]
+    color_ok = (
+        (accent_count <= 1)
+        & ~(t["bright_accent_bottom"] | b["bright_accent_bottom"] | o["bright_accent_bottom"])
+        & ((t["patterned"] + b["patterned"] + o["patterned"]) <= 1)
+    )
+
+    # Final score in the same order as score_outfit
+    total = np.zeros_like(weather_score)
+    total = total + weather_score
+    total = total + avg_weight * 30
+    total = total + np.where(formality_ok, 10, 0)
+    total = total + np.select([accent_count == 0, accent_count == 1], [10, 7], 0)
+    penalty = (weather_profile["is_extreme_cold"] or weather_profile["is_hot"]) & (weather_score < 20)
+    total = total - np.where(penalty, 20, 0)
+
+    return {"scores": total, "color_ok": np.broadcast_to(color_ok, shape), "formality_ok": np.broadcast_to(formality_ok, shape)}
+
+# Scoring every combination, returning raw scores and rule validity as (T, B, O + 1) arrays.
+# Index 0 on the last axis is "no outerwear".
+def score_combinations(tops, bottoms, outerwear, temperature_celsius, event_formality="casual", weather_condition="sunny"):
+    weather_profile = create_weather_profile(temperature_celsius, weather_condition)
+    t, b, o = _piece_arrays(tops, bottoms, outerwear, weather_profile)
+
+    t = {k: v[:, None, None] for k, v in t.items()}
+    b = {k: v[None, :, None] for k, v in b.items()}
+    o = {k: v[None, None, :] for k, v in o.items()}
+    return _score_block(t, b, o, weather_profile, event_formality)
+
+# Weather points of each piece before normalizing.
+def _weather_points(piece):
+    return piece["temp_score"] + piece["insulation_bonus"] + piece["protection_bonus"] + piece["rain_bonus"]
+
+# Scoring chosen combinations given as flat indices into the (T, B, O + 1) grid.
+def score_cells(tops, bottoms, outerwear, cells, temperature_celsius, event_formality="casual", weather_condition="sunny"):
+    weather_profile = create_weather_profile(temperature_celsius, weather_condition)
+    t, b, o = _piece_arrays(tops, bottoms, outerwear, weather_profile)
+    i, j, k = np.unravel_index(cells, (len(tops), len(bottoms), len(outerwear) + 1))
+
+    t = {key: v[i] for key, v in t.items()}
+    b = {key: v[j] for key, v in b.items()}
+    o = {key: v[k] for key, v in o.items()}
+    return _score_block(t, b, o, weather_profile, event_formality)
+
+# Upper bound of a weather ratio when the denominator can be anywhere in [low, high].
+def _ratio_bound(numerator, den_low, den_high):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bound = np.maximum(numerator / den_low, numerator / den_high)
+    return np.clip(np.nan_to_num(bound * 50, nan=50.0), 0, 50)
+
+# Upper bound on the score of any valid outfit starting with each (top, bottom) pair, as (T, B).
+# Adding outerwear can only add accents, patterns and formality spread, so a pair that
+# already breaks a rule is -inf.
+def _pair_bounds(t, b, o, event_formality):
+    tt = {k: v[:, None] for k, v in t.items()}
+    bb = {k: v[None, :] for k, v in b.items()}
+    pair_weather = _weather_points(tt) + _weather_points(bb)
+    pair_max = tt["max_score"] + bb["max_score"]
+    pair_weight = tt["compatibility"] + bb["compatibility"]
+    accent_count = tt["accent"] + bb["accent"]
+    accent_bound = np.select([accent_count == 0, accent_count == 1], [10, 7], 0)
+
+    # Without outerwear
+    bound = _ratio_bound(pair_weather, pair_max, pair_max) + pair_weight / 2 * 30
+
+    # With the most favourable outerwear for each term
+    if len(o["worn"]) > 1:
+        outer = {k: v[1:] for k, v in o.items()}
+        outer_bound = (
+            _ratio_bound(pair_weather + _weather_points(outer).max(), pair_max + outer["max_score"].min(), pair_max + outer["max_score"].max())
+            + (pair_weight + outer["compatibility"].max()) / 3 * 30
+        )
+        bound = np.maximum(bound, outer_bound)
+
+    bound = bound + 10 + accent_bound
+
+    # Pairs that can never be valid
+    valid = (
+        (accent_count <= 1)
+        & ~(tt["bright_accent_bottom"] | bb["bright_accent_bottom"])
+        & ((tt["patterned"] + bb["patterned"]) <= 1)
+        & (np.abs(tt["formality"] - bb["formality"]) <= 1)
+    )
+    if event_formality.lower() == "formal":
+        valid = valid & (tt["color"] == bb["color"])
+
+    return np.where(valid, bound, -np.inf)
+
+# Finding the best valid outfits over every combination without scoring all of them.
+# Tops are visited by their best possible score and pairs whose bound cannot reach the
+# current k-th best are skipped. Ties keep the (top, bottom, outerwear) order of the lists.
+def top_combinations(tops, bottoms, outerwear, temperature_celsius, event_formality="casual", weather_condition="sunny", count=3, min_score=30):
+    if not tops or not bottoms or count <= 0:
+        return []
+
+    weather_profile = create_weather_profile(temperature_celsius, weather_condition)
+    t, b, o = _piece_arrays(tops, bottoms, outerwear, weather_profile)
+
+    # Rounding keeps the order, so a rounded bound is still a bound on the rounded score.
+    # The small slack covers float error from adding the terms in a different order.
+    pair_bounds = np.round(_pair_bounds(t, b, o, event_formality) + 1e-9, 2)
+    top_bounds = pair_bounds.max(axis=1)
+    o_block = {k: v[None, None, :] for k, v in o.items()}
+
+    # Min-heap of (rounded score, -top, -bottom, -outer, raw score), the root is the worst kept result
+    heap = []
+    for i in np.argsort(-top_bounds, kind="stable"):
+        threshold = heap[0][0] if len(heap) == count else min_score
+        if top_bounds[i] < threshold:
+            break
+
+        rows = np.flatnonzero(pair_bounds[i] >= threshold)
+        if not len(rows):
+            continue
+
+        t_block = {k: v[i:i + 1, None, None] for k, v in t.items()}
+        b_block = {k: v[rows][None, :, None] for k, v in b.items()}
+        result = _score_block(t_block, b_block, o_block, weather_profile, event_formality)
+        scores = np.round(result["scores"][0], 2)
+
+        passing = result["color_ok"][0] & result["formality_ok"][0] & (scores >= min_score)
+        for r, k in zip(*np.nonzero(passing)):
+            entry = (float(scores[r, k]), -int(i), -int(rows[r]), -int(k), float(result["scores"][0, r, k]))
+            if len(heap) < count:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    outer_options = [None] + list(outerwear)
+    best = sorted(heap, reverse=True)
+    return [
+        {"top": tops[-i], "bottom": bottoms[-j], "outerwear": outer_options[-k], "score": round_score(raw)}
+        for _, i, j, k, raw in best
+    ]
+
+# Rounding one raw score the way score_outfit does.
+def round_score(raw):
+    return max(0.0, round(float(raw), 2))
@@ -0,0 +1,101 @@
+# Upload pipeline for garment images.
+# Importing the required libraries.
+import io, os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from remove_bg import remove_background
+from clip_model import extract_visual_signals_batch, CLIP_BATCH_SIZE
+from color_extractor import extract_colors
+from derive import derive_metadata
+from validation import validate_metadata, generate_validation_report
+from database import insert_garment, garment_image_url
+from thumbnails import make_renditions
+
+# Threads for background removal and color extraction.
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+
+# Analysing raw image bytes, yielding (idx, metadata, bg_removed_bytes, error) in order.
+# Images are handled one CLIP batch at a time so results arrive progressively.
+def analyze_uploads(raws):
+    for start in range(0, len(raws), CLIP_BATCH_SIZE):
+        yield from _analyze_chunk(raws[start:start + CLIP_BATCH_SIZE], start)
+
+# Analysing one chunk of images, decode failures are yielded in their place in the sequence.
+def _analyze_chunk(raws, offset):
+    # Decoding every file first.
+    decoded = []
+    failed = {}
+    for idx, raw in enumerate(raws, start=offset):
+        try:
+            image = Image.open(io.BytesIO(raw)).convert("RGB")
+            decoded.append((raw, image))
+        except Exception:
+            print(f"Error decoding image {idx + 1}")
+            failed[idx] = f"Error processing image {idx + 1}"
+
+    # Background removal and colors start right away on the pool.
+    bg_futures = [_executor.submit(_remove_and_extract_colors, raw) for raw, _ in decoded]
+
+    # CLIP only needs the original image so it runs meanwhile.
+    all_signals = extract_visual_signals_batch([image for _, image in decoded])
+
+    # Joining both branches per image.
+    joined = zip(all_signals, bg_futures)
+    for idx in range(offset, offset + len(raws)):
+        if idx in failed:
+            yield idx, None, None, failed[idx]
+            continue
+
+        clip_signals, bg_future = next(joined)
+        try:
+            bg_removed_bytes, color_data = bg_future.result()
+            metadata = build_metadata(idx, clip_signals, color_data)
+            yield idx, metadata, bg_removed_bytes, None
+
+        # Error message
+        except Exception:
+            print(f"Error processing image {idx + 1}")
+            traceback.print_exc()
+            yield idx, None, None, f"Error processing image {idx + 1}"
+
+# Removing the background and extracting colors from it.
+def _remove_and_extract_colors(raw):
+    bg_removed_bytes = remove_background(raw)
+    image_no_bg = Image.open(bg_removed_bytes).convert("RGBA")
+    return bg_removed_bytes, extract_colors(image_no_bg)
+
+# Deriving and validating metadata for one image.
+def build_metadata(idx, clip_signals, color_data):
+    # Getting the metadata
+    metadata = derive_metadata(clip_signals, color_data)
+
+    # Validating the metadata
+    validation_result = validate_metadata(metadata)
+    validated_meta = validation_result["validated_metadata"]
+
+    # Adding validation info to debug metadata.
+    validated_meta["debug_metadata"]["validation_flags"] = validation_result["validation_flags"]
+    validated_meta["debug_metadata"]["confidence_adjustment"] = validation_result["confidence_adjustment"]
+
+    # Log validation issues
+    if validation_result["validation_flags"]:
+        print(f"[{idx+1}] Validation flags:")
+        for flag in validation_result["validation_flags"]:
+            print(f"  - {flag}")
+
+    return validated_meta
+
+# Storing one analysed garment and building its upload result.
+def store_upload(idx, validated_meta, bg_removed_bytes):
+    # Storing the data with the raw image bytes and its thumbnails
+    image_bytes = bg_removed_bytes.getvalue()
+    garment_id = insert_garment(validated_meta, image_bytes=image_bytes, renditions=make_renditions(image_bytes))
+
+    if not garment_id:
+        return None
+
+    print(f"[{idx+1}] Saved as ID {garment_id}: {validated_meta['primary_category']} "
+          f"({validated_meta['confidence_band']} confidence)")
+    return {"id": garment_id, "image": garment_image_url(garment_id), "metadata": validated_meta, "validation_report": generate_validation_report(validated_meta)}
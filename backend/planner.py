@@ -0,0 +1,173 @@
+# Multi-day outfit planner.
+# Every day gets its candidate pool from the recommendation cache, so days with the same
+# conditions share the filtering and days with the same temperature share the scoring.
+# Outfits are then assigned by a backtracking search over each day's best options so no
+# garment is worn again within the repeat window, or as few as possible when that can't be done.
+
+# Importing the required libraries.
+import os
+import numpy as np
+from outfit_scoring import score_cells
+from outfit_safety import describe_outfit
+from recommendation_cache import get_candidate_pool
+
+# Days in which a garment is not worn twice, 1 allows repeats on consecutive days.
+PLAN_REPEAT_WINDOW = int(os.environ.get("PLAN_REPEAT_WINDOW", 3))
+
+# Longest forecast accepted by /plan.
+PLAN_MAX_DAYS = int(os.environ.get("PLAN_MAX_DAYS", 14))
+
+# Combinations ranked per pool before looking further, enough unless most garments are blocked.
+RANK_CHUNK = 256
+
+# Options tried per day when searching for a plan without repeats.
+PLAN_BRANCHING = 8
+
+# Search steps before giving up on a plan without repeats, each costs a fraction of a millisecond.
+PLAN_SEARCH_STEPS = int(os.environ.get("PLAN_SEARCH_STEPS", 2000))
+
+# Scoring a pool's valid combinations at the exact temperature of the day.
+# Cached pools cover a whole degree, so the scores are kept per plan rather than on the pool.
+def _scored(pool, temperature_celsius, event_formality, weather_condition):
+    outer_options = pool["outer_options"]
+    scores = score_cells(pool["tops"], pool["bottoms"], outer_options[1:], pool["cells"], temperature_celsius, event_formality, weather_condition)["scores"]
+    top, bottom, outer = np.unravel_index(pool["cells"], pool["shape"])
+
+    return {
+        "scores": scores,
+        "top": top,
+        "bottom": bottom,
+        "outer": outer,
+        "top_ids": np.array([g.get("db_id", -1) for g in pool["tops"]]),
+        "bottom_ids": np.array([g.get("db_id", -1) for g in pool["bottoms"]]),
+        "outer_ids": np.array([-1] + [g.get("db_id", -1) for g in outer_options[1:]]),
+    }
+
+# Positions of at least the best limit combinations, best first, ties in grid order.
+# The largest ranking made so far is kept on the scores, the search asks for it repeatedly.
+def _best_positions(scored, limit):
+    ranked = scored.get("ranked")
+    if ranked is not None and (ranked[0] >= limit or ranked[0] >= len(scored["scores"])):
+        return ranked[1]
+
+    scores = scored["scores"]
+    if limit < len(scores):
+        candidates = np.argpartition(-scores, limit - 1)[:limit]
+        # Keeping every combination tied with the last one
+        candidates = np.flatnonzero(scores >= scores[candidates].min())
+    else:
+        candidates = np.arange(len(scores))
+    positions = candidates[np.lexsort((candidates, -scores[candidates]))]
+    scored["ranked"] = (limit, positions)
+    return positions
+
+# Garment ids of a combination, outfits without outerwear have none for it.
+def _garment_ids(scored, position):
+    ids = (scored["top_ids"][scored["top"][position]], scored["bottom_ids"][scored["bottom"][position]], scored["outer_ids"][scored["outer"][position]])
+    return {int(i) for i in ids if i != -1}
+
+# Best few combinations avoiding the blocked garment ids, best first.
+def _unblocked_options(scored, blocked, count):
+    blocked = list(blocked)
+    top_ok = ~np.isin(scored["top_ids"], blocked)
+    bottom_ok = ~np.isin(scored["bottom_ids"], blocked)
+    outer_ok = ~np.isin(scored["outer_ids"], blocked)
+
+    # Looking at the best few first and widening only when most of them are blocked
+    limit = RANK_CHUNK
+    while True:
+        positions = _best_positions(scored, limit)[:limit]
+        allowed = top_ok[scored["top"][positions]] & bottom_ok[scored["bottom"][positions]] & outer_ok[scored["outer"][positions]]
+        options = positions[allowed][:count]
+        if len(options) >= count or limit >= len(scored["scores"]):
+            return [int(p) for p in options]
+        limit *= 8
+
+# Combination repeating the fewest blocked garments, the best scoring among those.
+def _fewest_repeats(scored, blocked):
+    blocked = list(blocked)
+    repeats = (
+        np.isin(scored["top_ids"], blocked)[scored["top"]].astype(np.int8)
+        + np.isin(scored["bottom_ids"], blocked)[scored["bottom"]]
+        + np.isin(scored["outer_ids"], blocked)[scored["outer"]]
+    )
+    candidates = np.flatnonzero(repeats == repeats.min())
+    return int(candidates[np.argmax(scored["scores"][candidates])])
+
+# Garments worn within the repeat window of a day, by the days already planned.
+def _blocked(picks, day, repeat_window):
+    blocked = set()
+    for other, (_, ids) in picks.items():
+        if abs(other - day) < repeat_window:
+            blocked |= ids
+    return blocked
+
+# Searching for a plan without repeats, trying each day's best few options and backtracking.
+# Returns the picks by day, or None when none is found within the search budget.
+def _search_plan(scored_days, order, repeat_window):
+    picks = {}
+    steps = [0]
+
+    def assign(i):
+        if i == len(order):
+            return True
+        d = order[i]
+        for position in _unblocked_options(scored_days[d], _blocked(picks, d, repeat_window), PLAN_BRANCHING):
+            steps[0] += 1
+            if steps[0] > PLAN_SEARCH_STEPS:
+                return False
+            picks[d] = (position, _garment_ids(scored_days[d], position))
+            if assign(i + 1):
+                return True
+            del picks[d]
+        return False
+
+    return picks if assign(0) else None
+
+# Planning one outfit per day.
+# days is a list of {"temperature", "weather", "event_formality"} dicts, in date order.
+def plan_outfits(days, repeat_window=None):
+    repeat_window = max(1, PLAN_REPEAT_WINDOW if repeat_window is None else int(repeat_window))
+
+    # Candidate pools for every day, shared between days with the same conditions
+    conditions = []
+    scored_by_day = {}
+    for day in days:
+        temp = day.get("temperature", 20)
+        weather = day.get("weather", "sunny")
+        formality = day.get("event_formality", "casual")
+        pool = get_candidate_pool(temp, weather, formality, mode="uniform")
+        scored = None
+        if pool:
+            key = (id(pool), temp, weather, formality)
+            if key not in scored_by_day:
+                scored_by_day[key] = _scored(pool, temp, formality, weather)
+            scored = scored_by_day[key]
+        conditions.append((temp, weather, formality, pool, scored))
+
+    # Planning the days with the fewest options first, days without any are left empty
+    scored_days = {d: c[4] for d, c in enumerate(conditions) if c[4] is not None and len(c[4]["scores"])}
+    order = sorted(scored_days, key=lambda d: len(scored_days[d]["scores"]))
+
+    # Without a plan free of repeats, every day takes the option repeating the fewest garments
+    picks = _search_plan(scored_days, order, repeat_window)
+    if picks is None:
+        picks = {}
+        for d in order:
+            position = _fewest_repeats(scored_days[d], _blocked(picks, d, repeat_window))
+            picks[d] = (position, _garment_ids(scored_days[d], position))
+
+    plan = []
+    for d, (temp, weather, formality, pool, scored) in enumerate(conditions):
+        if d not in picks:
+            plan.append({"outfit": None, "repeats": False})
+            continue
+
+        position, ids = picks[d]
+        top = pool["tops"][scored["top"][position]]
+        bottom = pool["bottoms"][scored["bottom"][position]]
+        outer = pool["outer_options"][scored["outer"][position]]
+        repeats = bool(ids & _blocked({o: p for o, p in picks.items() if o != d}, d, repeat_window))
+        plan.append({"outfit": describe_outfit(top, bottom, outer, temp, formality, weather), "repeats": repeats})
+
+    return plan
@@ -1,22 +1,25 @@
 # Outfit recommending system.
 # Importing required files.
-from database import get_all_garments
-from outfit_safety import (select_best_outfit, validate_color_rules, validate_formality_match, create_weather_profile, score_outfit)
+from database import garment_image_urls
+from wardrobe_cache import get_cached_outfit_wardrobe
+from garment_index import category_size, insulation_range, nearest_outside, rain_safe_values
+from thumbnails import OUTFIT_THUMBNAIL_SIZE
+from outfit_scoring import top_combinations
+from outfit_safety import (select_best_outfit, validate_color_rules, validate_formality_match, create_weather_profile)
 
 # Recommending a daily outfit.
 def recommend_daily_outfit(temperature_celsius, weather_condition="sunny", event_formality="casual"):
-    # Getting all the garments.
-    all_garments = get_all_garments()
+    # Getting the garments already separated by category.
+    garments, index = get_cached_outfit_wardrobe()
     
-    if not all_garments:
+    if not any(garments.values()):
         return {
             "error": "No garments in wardrobe. Please upload some clothes first."
         }
     
-    # Separating by category.
-    tops = [g for g in all_garments if g.get("primary_category") == "Top"]
-    bottoms = [g for g in all_garments if g.get("primary_category") == "Bottom"]
-    outerwear = [g for g in all_garments if g.get("primary_category") == "Outerwear"]
+    tops = garments["Top"]
+    bottoms = garments["Bottom"]
+    outerwear = garments["Outerwear"]
     
     if not tops or not bottoms:
         return {
@@ -27,9 +30,9 @@ def recommend_daily_outfit(temperature_celsius, weather_condition="sunny", event
     weather_profile = create_weather_profile(temperature_celsius, weather_condition)
     
     # Filtering by insulation scores.
-    tops_filtered, tops_fallback = _filter_by_insulation_smart(tops, weather_profile)
-    bottoms_filtered, bottoms_fallback = _filter_by_insulation_smart(bottoms, weather_profile)
-    outerwear_filtered, outerwear_fallback = _filter_by_insulation_smart(outerwear, weather_profile)
+    tops_filtered, tops_fallback = _filter_by_insulation_smart(index, "Top", weather_profile)
+    bottoms_filtered, bottoms_fallback = _filter_by_insulation_smart(index, "Bottom", weather_profile)
+    outerwear_filtered, outerwear_fallback = _filter_by_insulation_smart(index, "Outerwear", weather_profile)
     
     # Use filtered results.
     tops = tops_filtered if tops_filtered else tops_fallback
@@ -38,14 +41,14 @@ def recommend_daily_outfit(temperature_celsius, weather_condition="sunny", event
     
     # Weather condition filtering
     if weather_profile["is_wet"]:
-        # Choosing rain-safe outerwear
-        rain_safe_outer = [o for o in outerwear if o.get("rain_safe") == "true"]
-        if rain_safe_outer:
-            outerwear = rain_safe_outer
-        else:
-            maybe_safe = [o for o in outerwear if o.get("rain_safe") != "false"]
-            if maybe_safe:
-                outerwear = maybe_safe
+        # Choosing rain-safe outerwear, then outerwear not known to let rain through
+        maybe_safe = [v for v in rain_safe_values(index, "Outerwear") if v != "false"]
+        for rain_safe in (["true"], maybe_safe):
+            safe_filtered, safe_fallback = _filter_by_insulation_smart(index, "Outerwear", weather_profile, rain_safe)
+            safe_outer = safe_filtered if outerwear_filtered else safe_fallback
+            if safe_outer:
+                outerwear = safe_outer
+                break
     
     # Outerwear for cold conditions.
     need_outerwear = (
@@ -96,11 +99,12 @@ def recommend_daily_outfit(temperature_celsius, weather_condition="sunny", event
         }
     
     # Formatting response
+    image_urls = _outfit_image_urls([best_outfit])
     return {
         "outfit": {
-            "top": _format_garment(best_outfit["top"]),
-            "bottom": _format_garment(best_outfit["bottom"]),
-            "outerwear": _format_garment(best_outfit["outerwear"]) if best_outfit["outerwear"] else None
+            "top": _format_garment(best_outfit["top"], image_urls),
+            "bottom": _format_garment(best_outfit["bottom"], image_urls),
+            "outerwear": _format_garment(best_outfit["outerwear"], image_urls) if best_outfit["outerwear"] else None
         },
 
         "score": best_outfit["score"],
@@ -141,10 +145,10 @@ def recommend_daily_outfit(temperature_celsius, weather_condition="sunny", event
         }
     }
 
-# Filtering by insulation scores.
-def _filter_by_insulation_smart(garments, weather_profile):
-
-    if not garments:
+# Filtering a category by insulation scores with range queries on the wardrobe index.
+def _filter_by_insulation_smart(index, category, weather_profile, rain_safe=None):
+    total = category_size(index, category)
+    if not total:
         return [], []
     
     temp = weather_profile["temperature"]
@@ -152,47 +156,32 @@ def _filter_by_insulation_smart(garments, weather_profile):
     # Calculating ideal insulation for different temperature
     ideal_insulation = max(0, min(100, 95 - (temp * 2.5)))
     
-    strict_matches = []
-    close_matches = []
-    acceptable_matches = []
-    all_sorted = []
-    
-    for g in garments:
-        insulation = g.get("insulation_score", 50)
-        distance = abs(insulation - ideal_insulation)
-        
-        if distance <= 15:
-            # Perfect
-            strict_matches.append((g, distance))
-        elif distance <= 25:
-            # Close
-            close_matches.append((g, distance))
-        elif distance <= 35:
-            # ok
-            acceptable_matches.append((g, distance))
-        else:
-            # Not good.
-            all_sorted.append((g, distance))
-    
-    # Sorting each tier
-    strict_matches.sort(key=lambda x: x[1])
-    close_matches.sort(key=lambda x: x[1])
-    acceptable_matches.sort(key=lambda x: x[1])
-    all_sorted.sort(key=lambda x: x[1])
-    
-    # Returning strict matches.
-    if strict_matches:
-        strict_result = [g for g, dist in strict_matches]
-    elif close_matches:
-        strict_result = [g for g, dist in close_matches]
-    elif acceptable_matches:
-        strict_result = [g for g, dist in acceptable_matches]
-    else:
-        strict_result = []
-    
-    # Returning closest items.
-    num_fallback = max(2, len(garments) // 2)
-    fallback_result = [g for g, dist in all_sorted[:num_fallback]]
+    # Closest garments first, wardrobe order on ties
+    def by_distance(entries):
+        entries = [(abs(insulation - ideal_insulation), rank, g) for insulation, rank, g in entries]
+        entries.sort(key=lambda x: (x[0], x[1]))
+        return entries
+    
+    # Returning the tightest tier with matches: perfect, close, then ok.
+    # Tiers are picked on the whole category, rain_safe only narrows the garments returned.
+    strict_result = []
+    for band in (15, 25, 35):
+        low, high = ideal_insulation - band - 1e-9, ideal_insulation + band + 1e-9
+        if any(dist <= band for dist, _, _ in by_distance(insulation_range(index, category, low, high))):
+            window = insulation_range(index, category, low, high, rain_safe=rain_safe)
+            strict_result = [g for dist, _, g in by_distance(window) if dist <= band]
+            break
+    
+    # Returning closest items outside every tier.
+    num_fallback = max(2, total // 2)
+    outside = nearest_outside(index, category, ideal_insulation - 35, ideal_insulation + 35, num_fallback)
+    fallback = [e for e in by_distance(outside) if e[0] > 35][:num_fallback]
+    if rain_safe is not None and fallback:
+        # The matching garments among the closest, by distance and rank up to the last one kept
+        cutoff = fallback[-1][:2]
+        outside = nearest_outside(index, category, ideal_insulation - 35, ideal_insulation + 35, num_fallback, rain_safe=rain_safe)
+        fallback = [e for e in by_distance(outside) if e[0] > 35 and e[:2] <= cutoff]
+    fallback_result = [g for _, _, g in fallback]
     
     return strict_result, fallback_result
 
@@ -290,8 +279,13 @@ def _check_temp_appropriateness(pieces, weather_profile):
     
     return True
 
+# Thumbnail URLs of every garment in some outfits, looked up with one query.
+def _outfit_image_urls(outfits):
+    ids = [g.get("db_id") for o in outfits for g in (o["top"], o["bottom"], o["outerwear"]) if g]
+    return garment_image_urls(ids, size=OUTFIT_THUMBNAIL_SIZE)
+
 # Formatting the garment.
-def _format_garment(garment):
+def _format_garment(garment, image_urls):
     if not garment:
         return None
     
@@ -316,28 +310,28 @@ def _format_garment(garment):
         "compatibility_weight": garment.get("compatibility_weight"),
         "wind_resistance": garment.get("wind_resistance"),
         "rain_safe": garment.get("rain_safe"),
-        "image": f"data:image/png;base64,{garment.get('image_data')}" if garment.get("image_data") else None
+        "image": image_urls.get(garment.get("db_id"))
     }
 
 # Getting different suggestions.
 def get_outfit_alternatives(temperature_celsius, weather_condition="sunny", event_formality="casual", count=3):
 
-    all_garments = get_all_garments()
+    garments, index = get_cached_outfit_wardrobe()
     
-    if not all_garments:
+    if not any(garments.values()):
         return []
     
-    tops = [g for g in all_garments if g.get("primary_category") == "Top"]
-    bottoms = [g for g in all_garments if g.get("primary_category") == "Bottom"]
-    outerwear = [g for g in all_garments if g.get("primary_category") == "Outerwear"]
+    tops = garments["Top"]
+    bottoms = garments["Bottom"]
+    outerwear = garments["Outerwear"]
     
     # Weather profile
     weather_profile = create_weather_profile(temperature_celsius, weather_condition)
     
     # Filtering by insulation
-    tops_filtered, tops_fallback = _filter_by_insulation_smart(tops, weather_profile)
-    bottoms_filtered, bottoms_fallback = _filter_by_insulation_smart(bottoms, weather_profile)
-    outerwear_filtered, outerwear_fallback = _filter_by_insulation_smart(outerwear, weather_profile)
+    tops_filtered, tops_fallback = _filter_by_insulation_smart(index, "Top", weather_profile)
+    bottoms_filtered, bottoms_fallback = _filter_by_insulation_smart(index, "Bottom", weather_profile)
+    outerwear_filtered, outerwear_fallback = _filter_by_insulation_smart(index, "Outerwear", weather_profile)
     
     tops = tops_filtered if tops_filtered else tops_fallback
     bottoms = bottoms_filtered if bottoms_filtered else bottoms_fallback
@@ -348,34 +342,11 @@ def get_outfit_alternatives(temperature_celsius, weather_condition="sunny", even
     bottoms = _sort_by_priority(bottoms, weather_profile, "Bottom")
     outerwear = _sort_by_priority(outerwear, weather_profile, "Outerwear")
     
-    # Generating multiple valid outfits
-    candidates = []
-    
-    # Avoiding some clash.
-    for top in tops[:8]:
-        for bottom in bottoms[:8]:
-            for outer in [None] + outerwear[:5]:
-                pieces = [top, bottom, outer]
-                
-                # Valid matches.
-                if not validate_color_rules(pieces):
-                    continue
-                if not validate_formality_match(pieces, event_formality):
-                    continue
-                
-                # Score
-                outfit_score = score_outfit(top, bottom, outer, temperature_celsius, event_formality, weather_condition)
-                
-                # Removing low scores.
-                if outfit_score < 30:
-                    continue
-                
-                candidates.append({"top": top, "bottom": bottom, "outerwear": outer, "score": outfit_score })
-    
-    # Scoring
-    candidates.sort(key=lambda x: x["score"], reverse=True)
+    # Best valid combinations over the whole filtered wardrobe
+    candidates = top_combinations(tops, bottoms, outerwear, temperature_celsius, event_formality, weather_condition, count=count)
     
+    image_urls = _outfit_image_urls(candidates)
     return [{
-        "outfit": {"top": _format_garment(c["top"]), "bottom": _format_garment(c["bottom"]), "outerwear": _format_garment(c["outerwear"])},
+        "outfit": {"top": _format_garment(c["top"], image_urls), "bottom": _format_garment(c["bottom"], image_urls), "outerwear": _format_garment(c["outerwear"], image_urls)},
         "score": c["score"]
-    } for c in candidates[:count]]
\ No newline at end of file
+    } for c in candidates]
\ No newline at end of file
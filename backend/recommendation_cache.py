@@ -0,0 +1,94 @@
+# Cache of recommendation candidate pools.
+# Repeated /recommend calls (shuffle, weather refresh) reuse the filtered pool for the
+# same conditions and only the final pick is redone, so shuffles stay random.
+
+# Importing the required libraries.
+import os
+import math
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from database import get_wardrobe_version
+from wardrobe_cache import get_versioned_index
+from outfit_safety import create_weather_profile, build_indexed_candidate_pool, pick_from_pool, SELECTION_MODE
+
+# Number of candidate pools kept, least recently used are dropped first.
+RECOMMEND_CACHE_SIZE = int(os.environ.get("RECOMMEND_CACHE_SIZE", 128))
+
+# Total size of the cached pool arrays in bytes, least recently used are dropped first.
+RECOMMEND_CACHE_MAX_BYTES = int(os.environ.get("RECOMMEND_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Seconds a candidate pool stays valid.
+RECOMMEND_CACHE_TTL = int(os.environ.get("RECOMMEND_CACHE_TTL", 600))
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+# Cache key for the request conditions.
+# Temperatures are floored to whole degrees and the weather profile flags are part of the key,
+# so no temperature threshold falls inside one entry.
+def _pool_key(temperature_celsius, weather_condition, event_formality, mode, version):
+    profile = create_weather_profile(temperature_celsius, weather_condition)
+    flags = tuple(k for k, v in profile.items() if v is True)
+    return (math.floor(temperature_celsius), flags, profile["condition"], event_formality.lower(), mode, version)
+
+# Getting a cached pool, None when missing or expired.
+def _get_pool(key):
+    with _pools_lock:
+        entry = _pools.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created_at"] > RECOMMEND_CACHE_TTL:
+            del _pools[key]
+            return None
+        _pools.move_to_end(key)
+        return entry
+
+# Bytes held by the arrays of a pool.
+def _pool_bytes(pool):
+    if not pool:
+        return 0
+    return sum(v.nbytes for v in pool.values() if isinstance(v, np.ndarray))
+
+# Storing a pool, dropping pools of older wardrobe versions and the oldest over the limits.
+# The wardrobe version is the last part of the key.
+def _put_pool(key, pool):
+    size = _pool_bytes(pool)
+    with _pools_lock:
+        for stale in [k for k in _pools if k[-1] != key[-1]]:
+            del _pools[stale]
+        if size > RECOMMEND_CACHE_MAX_BYTES:
+            return
+
+        _pools[key] = {"pool": pool, "created_at": time.time(), "bytes": size}
+        _pools.move_to_end(key)
+        total = sum(entry["bytes"] for entry in _pools.values())
+        while len(_pools) > RECOMMEND_CACHE_SIZE or total > RECOMMEND_CACHE_MAX_BYTES:
+            _, dropped = _pools.popitem(last=False)
+            total -= dropped["bytes"]
+
+# Getting the candidate pool for these conditions, building it on a miss.
+def get_candidate_pool(temperature_celsius, weather_condition="sunny", event_formality="casual", mode=None):
+    mode = (mode or SELECTION_MODE).lower()
+    key = _pool_key(temperature_celsius, weather_condition, event_formality, mode, get_wardrobe_version())
+    entry = _get_pool(key)
+    if entry is not None:
+        return entry["pool"]
+
+    index, version = get_versioned_index()
+    pool = build_indexed_candidate_pool(index, temperature_celsius, event_formality, weather_condition, mode)
+    _put_pool(_pool_key(temperature_celsius, weather_condition, event_formality, mode, version), pool)
+    return pool
+
+# Recommending an outfit from the cached candidate pool for these conditions.
+def recommend_from_cache(temperature_celsius, weather_condition="sunny", event_formality="casual", seed=None):
+    pool = get_candidate_pool(temperature_celsius, weather_condition, event_formality)
+    if not pool:
+        return None
+    return pick_from_pool(pool, temperature_celsius, event_formality, weather_condition, seed)
+
+# Dropping every cached pool.
+def clear_recommendation_cache():
+    with _pools_lock:
+        _pools.clear()
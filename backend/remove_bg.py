@@ -1,7 +1,69 @@
 # Importing required library.
-from rembg import remove
+from rembg import remove, new_session
+from PIL import Image, ImageOps
 import io
+import os
+import threading
+
+# Background removal model, u2netp and silueta are lighter options.
+REMBG_MODEL = os.environ.get("REMBG_MODEL", "u2net")
+
+# Longest output side for the downscaled mode, 0 keeps full resolution.
+REMBG_MAX_SIDE = int(os.environ.get("REMBG_MAX_SIDE", 0))
+
+# Longest side of the proxy image the mask is computed on.
+REMBG_MASK_SIDE = int(os.environ.get("REMBG_MASK_SIDE", 640))
+
+# Shared sessions per model name.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Getting a shared rembg session, creating it on first use.
+def get_session(model_name=None):
+    model_name = model_name or REMBG_MODEL
+    session = _sessions.get(model_name)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        # Another thread may have created it while waiting
+        session = _sessions.get(model_name)
+        if session is None:
+            session = new_session(model_name)
+            _sessions[model_name] = session
+
+    return session
 
 # Removing background from image.
-def remove_background(image_bytes):
-    return io.BytesIO(remove(image_bytes))
\ No newline at end of file
+def remove_background(image_bytes, model_name=None, max_side=None):
+    max_side = REMBG_MAX_SIDE if max_side is None else max_side
+    if max_side:
+        return _remove_background_downscaled(image_bytes, model_name, max_side)
+
+    return io.BytesIO(remove(image_bytes, session=get_session(model_name)))
+
+# Computing the mask on a small proxy and applying it to a size-capped image.
+def _remove_background_downscaled(image_bytes, model_name, max_side):
+    # Applying the EXIF rotation first, rembg would otherwise rotate only the proxy
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("RGB")
+
+    # Capping the output size
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    # Mask on the proxy image
+    proxy = image.copy()
+    mask_side = min(REMBG_MASK_SIDE, max_side)
+    if max(proxy.size) > mask_side:
+        proxy.thumbnail((mask_side, mask_side), Image.BILINEAR)
+    mask = remove(proxy, session=get_session(model_name), only_mask=True).convert("L")
+
+    # Upsampling the mask to the output size
+    if mask.size != image.size:
+        mask = mask.resize(image.size, Image.BILINEAR)
+
+    image.putalpha(mask)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    output.seek(0)
+    return output
@@ -39,6 +39,10 @@ CORE_SCHEMA = {
     # Neutral | Dark | Light | Bright | Earth
     "color_family": str,
     
+    # Top colors with pixel shares
+    # [{"rgb": [r, g, b], "share": float, "color_family": str}]
+    "color_palette": list,
+    
     # Outfit safety checks
     # base | accent
     "color_role": str,
@@ -76,6 +80,7 @@ def get_empty_garment():
         "rain_safe": "unknown",
         "wind_resistance": "Low",
         "color_family": "Neutral",
+        "color_palette": [],
         "color_role": "base",
         "compatibility_weight": 0.5,
         
@@ -0,0 +1,108 @@
+# Randomized regression tests for the vectorized outfit scoring.
+# Every grid score and rule check is compared against the per-outfit functions in outfit_safety.
+# Run from backend with: python -m pytest -q test_outfit_scoring.py
+
+# Importing the required libraries.
+import random
+import unittest
+import numpy as np
+from outfit_safety import score_outfit, validate_color_rules, validate_formality_match
+from outfit_scoring import score_combinations, score_cells, top_combinations, round_score
+
+WEATHER = ["sunny", "rain", "windy", "snow"]
+FORMALITY = ["casual", "smart-casual", "formal"]
+
+# Building a random garment, with the optional fields sometimes missing.
+def random_garment(rnd, category):
+    garment = {
+        "primary_category": category,
+        "insulation_score": rnd.choice([rnd.uniform(0, 100), rnd.randint(0, 100)]),
+        "weather_protection_score": rnd.uniform(0, 100),
+        "rain_safe": rnd.choice(["true", "false", "unknown"]),
+        "compatibility_weight": round(rnd.uniform(0.4, 1), 3),
+        "formality_level": rnd.choice(["Casual", "Smart-Casual", "Formal"]),
+        "color_family": rnd.choice(["Neutral", "Dark", "Light", "Bright", "Earth"]),
+        "color_role": rnd.choice(["base", "accent"]),
+    }
+    if rnd.random() < 0.3:
+        garment["color_palette"] = [
+            {"rgb": [30, 30, 35], "share": 0.5, "color_family": "Dark"},
+            {"rgb": rnd.choice([[20, 22, 28], [200, 40, 40]]), "share": 0.3, "color_family": rnd.choice(["Dark", "Bright"])},
+        ]
+    if rnd.random() < 0.1:
+        del garment["insulation_score"]
+    return garment
+
+# Building a random wardrobe and request conditions.
+def random_case(rnd, max_tops, max_bottoms, max_outer):
+    tops = [random_garment(rnd, "Top") for _ in range(rnd.randint(1, max_tops))]
+    bottoms = [random_garment(rnd, "Bottom") for _ in range(rnd.randint(1, max_bottoms))]
+    outerwear = [random_garment(rnd, "Outerwear") for _ in range(rnd.randint(0, max_outer))]
+
+    # Copies of a garment score the same, so the order of ties gets exercised
+    if rnd.random() < 0.5:
+        tops.append(dict(rnd.choice(tops)))
+        bottoms.insert(0, dict(rnd.choice(bottoms)))
+
+    temperature = rnd.choice([-10, -1, 0, 5, 9, 12, 15, 18, 22, 31, 35, rnd.uniform(-15, 40)])
+    return tops, bottoms, outerwear, temperature, rnd.choice(FORMALITY), rnd.choice(WEATHER)
+
+# Ranking the whole grid the way top_combinations should: rounded score, ties in grid order.
+def brute_force_top(tops, bottoms, outerwear, temperature, formality, weather, count, min_score=30):
+    outer_options = [None] + outerwear
+    ranked = []
+    for i, top in enumerate(tops):
+        for j, bottom in enumerate(bottoms):
+            for k, outer in enumerate(outer_options):
+                pieces = [top, bottom, outer]
+                if not validate_color_rules(pieces) or not validate_formality_match(pieces, formality):
+                    continue
+                score = score_outfit(top, bottom, outer, temperature, formality, weather)
+                if score >= min_score:
+                    ranked.append((-score, (i, j, k), (id(top), id(bottom), id(outer), score)))
+    ranked.sort(key=lambda r: (r[0], r[1]))
+    return [r[2] for r in ranked[:count]]
+
+class ScoreCombinationsTest(unittest.TestCase):
+    # Every cell of the grid matches the per-outfit score and rule checks.
+    def test_grid_matches_per_outfit_functions(self):
+        rnd = random.Random(1)
+        for _ in range(40):
+            tops, bottoms, outerwear, temperature, formality, weather = random_case(rnd, 6, 5, 4)
+            result = score_combinations(tops, bottoms, outerwear, temperature, formality, weather)
+
+            for i, top in enumerate(tops):
+                for j, bottom in enumerate(bottoms):
+                    for k, outer in enumerate([None] + outerwear):
+                        pieces = [top, bottom, outer]
+                        with self.subTest(temperature=temperature, weather=weather, formality=formality, cell=(i, j, k)):
+                            self.assertEqual(round_score(result["scores"][i, j, k]), score_outfit(top, bottom, outer, temperature, formality, weather))
+                            self.assertEqual(bool(result["color_ok"][i, j, k]), validate_color_rules(pieces))
+                            self.assertEqual(bool(result["formality_ok"][i, j, k]), validate_formality_match(pieces, formality))
+
+    # Scoring a subset of cells gives the same scores as the full grid.
+    def test_cells_match_grid(self):
+        rnd = random.Random(2)
+        for _ in range(40):
+            tops, bottoms, outerwear, temperature, formality, weather = random_case(rnd, 8, 8, 4)
+            grid = score_combinations(tops, bottoms, outerwear, temperature, formality, weather)["scores"]
+            cells = np.array(sorted(rnd.sample(range(grid.size), min(grid.size, 20))), dtype=np.int32)
+            scores = score_cells(tops, bottoms, outerwear, cells, temperature, formality, weather)["scores"]
+            np.testing.assert_allclose(scores, grid.ravel()[cells])
+
+class TopCombinationsTest(unittest.TestCase):
+    # The pruned search returns the same outfits, scores and tie order as ranking every combination.
+    def test_matches_brute_force(self):
+        rnd = random.Random(3)
+        for _ in range(150):
+            tops, bottoms, outerwear, temperature, formality, weather = random_case(rnd, 12, 12, 5)
+            count = rnd.randint(1, 6)
+            found = [
+                (id(o["top"]), id(o["bottom"]), id(o["outerwear"]), o["score"])
+                for o in top_combinations(tops, bottoms, outerwear, temperature, formality, weather, count)
+            ]
+            with self.subTest(temperature=temperature, weather=weather, formality=formality, count=count):
+                self.assertEqual(found, brute_force_top(tops, bottoms, outerwear, temperature, formality, weather, count))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+# Thumbnail renditions of garment images.
+# Importing the required libraries.
+import io
+from PIL import Image
+
+# Longest side of every rendition, smallest first.
+THUMBNAIL_SIZES = (128, 256, 512)
+
+# Sizes used by the wardrobe grid and the outfit cards.
+WARDROBE_THUMBNAIL_SIZE = 256
+OUTFIT_THUMBNAIL_SIZE = 512
+
+# WebP quality for the renditions.
+WEBP_QUALITY = 80
+
+# Content type of every rendition.
+RENDITION_MIME_TYPE = "image/webp"
+
+# Picking the smallest rendition at least as big as requested, None means the original.
+def pick_rendition_size(requested):
+    for size in THUMBNAIL_SIZES:
+        if requested <= size:
+            return size
+    return None
+
+# Encoding one WebP rendition with alpha.
+def make_rendition(image_bytes, size):
+    return make_renditions(image_bytes, sizes=(size,))[size]
+
+# Encoding WebP renditions of an image for every size.
+def make_renditions(image_bytes, sizes=THUMBNAIL_SIZES):
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+    renditions = {}
+
+    # Shrinking from the largest size down so each step starts smaller
+    for size in sorted(sizes, reverse=True):
+        if max(image.size) > size:
+            image.thumbnail((size, size), Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=WEBP_QUALITY, method=4)
+        renditions[size] = output.getvalue()
+
+    return renditions
@@ -0,0 +1,49 @@
+# In-process cache of the parsed wardrobe.
+# The wardrobe version in SQLite tells every worker process when to reload.
+# Cached garments are shared, callers must not modify them.
+
+# Importing the required libraries.
+import threading
+from database import get_all_garments, get_wardrobe_version
+from garment_index import build_index
+
+OUTFIT_CATEGORIES = ("Top", "Bottom", "Outerwear")
+
+_cache = {"version": None, "by_category": {}, "index": build_index([])}
+_cache_lock = threading.Lock()
+
+# Getting the cache for the current wardrobe version, reloading when stale.
+def _current():
+    global _cache
+    version = get_wardrobe_version()
+    cache = _cache
+    if cache["version"] == version:
+        return cache
+
+    with _cache_lock:
+        if _cache["version"] != version:
+            garments = get_all_garments()
+            by_category = {}
+            for g in garments:
+                by_category.setdefault(g.get("primary_category", "Unknown"), []).append(g)
+
+            # Swapping the whole dict so readers never see a half update
+            _cache = {"version": version, "by_category": by_category, "index": build_index(garments)}
+
+        return _cache
+
+# Getting tops, bottoms and outerwear with the attribute index of the same version.
+def get_cached_outfit_wardrobe():
+    cache = _current()
+    return _outfit_garments(cache), cache["index"]
+
+# Getting the attribute index with the wardrobe version it was built at.
+def get_versioned_index():
+    cache = _current()
+    return cache["index"], cache["version"]
+
+# Copying the outfit category lists out of a cache snapshot.
+def _outfit_garments(cache):
+    by_category = cache["by_category"]
+    return {category: list(by_category.get(category, [])) for category in OUTFIT_CATEGORIES}
+
@@ -5,6 +5,7 @@ const emojiList = ['👕', '👔', '👖', '🧥', '👗', '🎽', '👚', '🩳
 let emojiIndex = 0;
 let mainRecommendation = null;
 let currentAlternativeIndex = 0;
+const UPLOAD_STALL_TIMEOUT_MS = 5 * 60 * 1000;
 
 // Initialize
 window.addEventListener('load', () => {
@@ -239,10 +240,17 @@ async function uploadImages() {
     
     try {
         const response = await fetch('/upload', { method: 'POST', body: formData });
-        const result = await response.json();
+        const job = await response.json();
+        if (!response.ok) throw new Error(job.error || 'Upload rejected');
+        const result = await pollUploadJob(job.job_id);
         
         document.getElementById('loadingOverlay').classList.remove('active');
         
+        if (result.status === 'failed') {
+            alert('Upload failed. Please try again.');
+            return;
+        }
+        
         if (result.results) {
             selectedFiles = [];
             filePreview.innerHTML = '';
@@ -257,6 +265,30 @@ async function uploadImages() {
     }
 }
 
+// Waiting for the upload job to finish, giving up when it makes no progress for too long
+async function pollUploadJob(jobId) {
+    let lastProgress = null;
+    let lastChange = Date.now();
+    
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        
+        // Unknown or expired job, the upload can no longer be followed
+        if (!response.ok) throw new Error(job.error || `Job ${jobId} not found`);
+        if (job.status === 'done' || job.status === 'failed') return job;
+        
+        const progress = `${job.status}:${job.processed}`;
+        if (progress !== lastProgress) {
+            lastProgress = progress;
+            lastChange = Date.now();
+        } else if (Date.now() - lastChange > UPLOAD_STALL_TIMEOUT_MS) {
+            throw new Error(`Job ${jobId} stopped making progress`);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Buffer
 function startEmojiCarousel() {
     const emojiEl = document.getElementById('processingEmoji');
@@ -368,7 +400,7 @@ function displayGarments(garments) {
         card.style.animationDelay = `${index * 0.05}s`;
         card.id = `garment-${garment.db_id || index}`;
         
-        const imgSrc = garment.image_data ? `data:image/png;base64,${garment.image_data}` : '';
+        const imgSrc = garment.thumbnail_url || garment.image_url || '';
         const tempRange = garment.temp_range || {};
         const seasons = Array.isArray(garment.seasonality) ? garment.seasonality.join(', ') : 'All';
         